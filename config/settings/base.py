@@ -65,6 +65,7 @@ DJANGO_APPS = [
     # "django.contrib.humanize", # Handy template tags
     "django.contrib.admin",
     "django.contrib.gis",
+    "django.contrib.postgres",
     'django.forms',
 ]
 THIRD_PARTY_APPS = [
@@ -225,6 +226,18 @@ EMAIL_BACKEND = 'djcelery_email.backends.CeleryEmailBackend'
 CELERY_EMAIL_BACKEND = env(
     "DJANGO_EMAIL_BACKEND", default="django.core.mail.backends.smtp.EmailBackend"
 )
+# messages per celery task and SMTP connection for batched sends
+CELERY_EMAIL_CHUNK_SIZE = 50
+# Backend for mail batches sent from celery tasks (send_mail_messages,
+# bulk mail), set to signmob.users.mail_backends.AsyncSMTPEmailBackend
+# to send them directly over a few parallel SMTP connections
+BULK_EMAIL_BACKEND = env("DJANGO_BULK_EMAIL_BACKEND", default=EMAIL_BACKEND)
+# signmob.users.mail_backends.AsyncSMTPEmailBackend
+EMAIL_ASYNC_CONCURRENCY = env.int("DJANGO_EMAIL_ASYNC_CONCURRENCY", default=4)
+EMAIL_ASYNC_RETRIES = 3
+EMAIL_ASYNC_RETRY_DELAY = 1
+# users per bulk mail task, chunks of one job run in parallel
+BULK_MAIL_CHUNK_SIZE = 200
 
 # ADMIN
 # ------------------------------------------------------------------------------
@@ -361,3 +374,57 @@ SLACK_LEGACY_TOKEN = env('SLACK_LEGACY_TOKEN', default='')
 SLACK_INVITE_CHANNELS = 'CD1626GNA'
 
 CONTACT_EMAIL = 'info@volksentscheid-transparenz.de'
+
+# Maximum age of the cached /api/collection/ feed in seconds
+COLLECTION_FEED_CACHE_TIMEOUT = 60 * 60
+# Browser cache time for /api/collection/tiles/ vector tiles in seconds
+COLLECTION_TILE_MAX_AGE = 60 * 60 * 6
+# /api/collection/?zoom= up to this zoom level returns clusters
+COLLECTION_CLUSTER_MAX_ZOOM = 12
+# Render /api/collection/ without DRF serializer fields
+COLLECTION_FEED_FAST_SERIALIZER = True
+# Oldest ?since= version answered with a delta, tombstones are kept as long
+COLLECTION_SYNC_MAX_AGE = 60 * 60 * 24 * 7
+# Upper bound for the ?days= event window on the collection API
+COLLECTION_EVENT_WINDOW_MAX_DAYS = 90
+# Users with their Kiez within this many meters of a new or reported
+# collection place get an email, 0 to disable
+COLLECTION_NEARBY_RADIUS = env.int('COLLECTION_NEARBY_RADIUS', default=1500)
+# Users per email task when notifying nearby users
+COLLECTION_NEARBY_CHUNK_SIZE = 200
+# Answer nearest team lookups from an in-process index instead of the database
+COLLECTION_GROUP_INDEX = env.bool('COLLECTION_GROUP_INDEX', default=False)
+# Submitted collection places with a similar name or address within this
+# many meters of an existing place are flagged as duplicates
+COLLECTION_DUPLICATE_DISTANCE = 50
+# Directory for the pre-compressed collection feed snapshot, empty to disable
+COLLECTION_SNAPSHOT_ROOT = env('COLLECTION_SNAPSHOT_ROOT', default='')
+COLLECTION_SNAPSHOT_URL = '/snapshot/'
+COLLECTION_SNAPSHOT_MAX_AGE = 60
+# Seconds between digests of event joins and cancellations
+COLLECTION_NOTIFICATION_INTERVAL = env.int(
+    'COLLECTION_NOTIFICATION_INTERVAL', default=30 * 60
+)
+COLLECTION_NOTIFICATION_KEEP_DAYS = 30
+
+CELERY_BEAT_SCHEDULE = {
+    # picks up time window changes, only writes when the feed changed
+    'write-collection-snapshot': {
+        'task': 'signmob.collection.tasks.write_collection_snapshot_task',
+        'schedule': 5 * 60,
+    },
+    # delta sync answers no older versions, see COLLECTION_SYNC_MAX_AGE
+    'purge-collection-tombstones': {
+        'task': 'signmob.collection.tasks.purge_collection_tombstones',
+        'schedule': 24 * 60 * 60,
+    },
+    # picks up bulk mail chunks of crashed or timed out workers
+    'resume-bulk-mail-jobs': {
+        'task': 'signmob.users.tasks.resume_bulk_mail_jobs',
+        'schedule': 10 * 60,
+    },
+    'send-event-notification-digest': {
+        'task': 'signmob.collection.tasks.send_event_notification_digest_task',
+        'schedule': COLLECTION_NOTIFICATION_INTERVAL,
+    },
+}
@@ -122,6 +122,10 @@ INSTALLED_APPS += ["gunicorn"]  # noqa F405
 # ------------------------------------------------------------------------------
 # http://whitenoise.evans.io/en/latest/django.html#enable-whitenoise
 MIDDLEWARE.insert(1, "whitenoise.middleware.WhiteNoiseMiddleware")  # noqa F405
+MIDDLEWARE.insert(  # noqa F405
+    2, "signmob.collection.middleware.CollectionSnapshotMiddleware"
+)
+COLLECTION_SNAPSHOT_ROOT = env("COLLECTION_SNAPSHOT_ROOT", default="/app/snapshot")
 
 
 # LOGGING
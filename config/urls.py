@@ -8,12 +8,19 @@ from django.views.decorators.clickjacking import xframe_options_exempt
 
 from rest_framework.routers import DefaultRouter
 
-from signmob.collection.api_views import CollectionViewSet
+from signmob.collection.api_views import (
+    CollectionViewSet, CollectionTerritoryViewSet, collection_heatmap,
+    collection_search, collection_tile
+)
 from signmob.users.views import link_login
 from signmob.views import ContactView
 
 # Create a router and register our viewsets with it.
 router = DefaultRouter()
+router.register(
+    r"collection/territories", CollectionTerritoryViewSet,
+    basename="collection-territory"
+)
 router.register(r"collection", CollectionViewSet, basename="collection")
 
 urlpatterns = [
@@ -21,6 +28,18 @@ urlpatterns = [
 
     path("termine/", include('signmob.calendar_urls', namespace='schedule')),
     path("termine/", include("schedule.urls")),
+    path(
+        "api/collection/tiles/<int:z>/<int:x>/<int:y>.mvt",
+        collection_tile, name="collection-tile"
+    ),
+    path(
+        "api/collection/heatmap/", collection_heatmap,
+        name="collection-heatmap"
+    ),
+    path(
+        "api/collection/search/", collection_search,
+        name="collection-search"
+    ),
     path("api/", include(router.urls)),
     # Django Admin, use {% url 'admin:index' %}
     path(settings.ADMIN_URL, admin.site.urls),
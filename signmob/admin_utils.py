@@ -22,7 +22,7 @@ class SendMailMixin():
             subject = request.POST.get('subject', '')
             body = request.POST.get('body', '')
             count = len(user_ids)
-            send_bulk_mail.delay(user_ids, subject, body)
+            send_bulk_mail(user_ids, subject, body, created_by=request.user)
             self.message_user(request, _("%d mail tasks queued." % count))
             return None
 
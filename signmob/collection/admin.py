@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 
 from django.contrib import admin
+from django.http import HttpResponse
 from django.shortcuts import redirect
 from django.urls import path
 from django.utils import timezone
@@ -20,11 +21,31 @@ from .models import (
     CollectionResult,
     CollectionEventMember,
     CollectionGroupMember,
+    CollectionTerritory,
 )
+from .routes import (
+    export_route_csv, export_route_gpx, get_delivery_route,
+    get_pending_locations
+)
+from .search import get_search_filter
 from .tasks import material_sent_task
 from .utils import get_occurrence
 
 
+class SearchVectorAdminMixin:
+    # only enables the search box, see get_search_results
+    search_fields = ('name',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # full text and trigram search on indexes instead of icontains
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return queryset.filter(
+            get_search_filter(queryset.model, search_term)
+        ), False
+
+
 class CollectionEventMemberInline(admin.StackedInline):
     model = CollectionEventMember
 
@@ -108,19 +129,24 @@ class CollectionEventAdmin(SendMailMixin, LeafletGeoAdmin):
         return list(set(qs.values_list('user_id', flat=True)))
 
 
-class CollectionLocationAdmin(LeafletGeoAdmin):
+class CollectionLocationAdmin(SearchVectorAdminMixin, LeafletGeoAdmin):
     display_raw = True
-    raw_id_fields = ('events',)
+    raw_id_fields = ('events', 'duplicate_of')
     date_hierarchy = 'start'
     list_display = (
         'name', 'address', 'start', 'end', 'needs_check',
-        'send_material'
+        'send_material', 'closest_group', 'duplicate_of'
     )
     list_filter = (
         'needs_check', 'accumulation',
-        'start',
+        'start', 'closest_group',
     )
-    actions = ['set_material_sent']
+    readonly_fields = ('closest_group', 'closest_group_distance')
+    list_select_related = ('closest_group', 'duplicate_of')
+    actions = [
+        'set_material_sent', 'export_delivery_route_csv',
+        'export_delivery_route_gpx'
+    ]
 
     def set_material_sent(self, request, queryset):
         count = 0
@@ -133,12 +159,35 @@ class CollectionLocationAdmin(LeafletGeoAdmin):
         self.message_user(request, _("%d emails sent to location owners.") % count)
     set_material_sent.short_description = _('Send material delivery notification')
 
+    def export_delivery_route_csv(self, request, queryset):
+        route = get_delivery_route(get_pending_locations(queryset))
+        response = HttpResponse(
+            export_route_csv(route), content_type='text/csv; charset=utf-8'
+        )
+        response['Content-Disposition'] = 'attachment; filename="route.csv"'
+        return response
+    export_delivery_route_csv.short_description = _(
+        'Export material delivery route (CSV)'
+    )
+
+    def export_delivery_route_gpx(self, request, queryset):
+        route = get_delivery_route(get_pending_locations(queryset))
+        response = HttpResponse(
+            export_route_gpx(route), content_type='application/gpx+xml'
+        )
+        response['Content-Disposition'] = 'attachment; filename="route.gpx"'
+        return response
+    export_delivery_route_gpx.short_description = _(
+        'Export material delivery route (GPX)'
+    )
+
 
 class CollectionGroupMemberInline(admin.StackedInline):
     model = CollectionGroupMember
 
 
-class CollectionGroupAdmin(SendMailMixin, LeafletGeoAdmin):
+class CollectionGroupAdmin(SearchVectorAdminMixin, SendMailMixin,
+                           LeafletGeoAdmin):
     inlines = [CollectionGroupMemberInline]
     save_on_top = True
     actions = ['send_mail']
@@ -191,10 +240,25 @@ class CollectionResultAdmin(admin.ModelAdmin):
     )
 
 
+class CollectionTerritoryAdmin(LeafletGeoAdmin):
+    list_display = ('group', 'updated')
+    readonly_fields = ('group', 'updated')
+    actions = ['rebuild']
+
+    def has_add_permission(self, request):
+        return False
+
+    def rebuild(self, request, queryset):
+        count = CollectionTerritory.objects.rebuild()
+        self.message_user(request, _("%d team territories rebuilt.") % count)
+    rebuild.short_description = _('Rebuild all team territories')
+
+
 admin.site.register(CollectionGroup, CollectionGroupAdmin)
 admin.site.register(CollectionEvent, CollectionEventAdmin)
 admin.site.register(CollectionLocation, CollectionLocationAdmin)
 admin.site.register(CollectionResult, CollectionResultAdmin)
+admin.site.register(CollectionTerritory, CollectionTerritoryAdmin)
 admin.site.register(CollectionGroupMember, CollectionGroupMemberAdmin)
 admin.site.register(CollectionEventMember, CollectionEventMemberAdmin)
 
@@ -1,20 +1,43 @@
-from datetime import timedelta
+from collections import OrderedDict
+from datetime import datetime, time, timedelta
+import hashlib
+import json
+import math
 
+from django.contrib.gis.geos import Polygon
+from django.core.cache import cache
+from django.db import connection
 from django.db.models import (
-    F, Q, Value, CharField, IntegerField, DateTimeField
+    F, Q, Min, Value, CharField, IntegerField, DateTimeField
 )
 from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, quote_etag
+)
 from django.utils.formats import date_format
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date
 
 from rest_framework_gis.serializers import (
-    GeometryField, GeoFeatureModelListSerializer
+    GeometryField, GeoFeatureModelListSerializer, GeoFeatureModelSerializer
 )
 from rest_framework import viewsets, serializers
-from rest_framework.response import Response
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ParseError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder as DRFJSONEncoder
+
+from schedule.models import Occurrence
 
-from .models import CollectionGroup, CollectionLocation, CollectionEvent
+from .models import (
+    CollectionGroup, CollectionLocation, CollectionEvent, CollectionResult,
+    CollectionTerritory, CollectionTombstone
+)
+from .search import get_search_filter, get_search_score
 from .utils import GeoJSONMixin
 
 
@@ -79,66 +102,1020 @@ def add_details(data):
         yield d
 
 
+COLLECTION_FEED_CACHE_KEY = 'collection:feed'
+COLLECTION_VERSION_CACHE_KEY = 'collection:feed-version'
+COLLECTION_TILE_CACHE_KEY = 'collection:tile:{version}:{z}:{x}:{y}'
+COLLECTION_CLUSTER_CACHE_KEY = 'collection:cluster:{version}:{zoom}'
+COLLECTION_CACHE_VERSION_KEY = 'collection:cache-version'
+COLLECTION_HEATMAP_CACHE_KEY = 'collection:heatmap:{version}:{start}:{end}:{size}'
+COLLECTION_HEATMAP_VERSION_KEY = 'collection:heatmap-version'
+COLLECTION_KINDS = ('group', 'event', 'location')
+COLLECTION_MODELS = {
+    'group': CollectionGroup,
+    'event': CollectionEvent,
+    'location': CollectionLocation,
+}
+EVENT_WINDOW = timedelta(days=15)
+SYNC_VERSION_HEADER = 'X-Sync-Version'
+# changes committed after their updated timestamp was set
+# must not fall between two delta requests
+SYNC_SAFETY_MARGIN = timedelta(minutes=1)
+
+# WARNING: only change order with care
+# https://code.djangoproject.com/ticket/28553
+COLLECTION_COLUMNS = (
+    "id", "name",
+    "description", "geo",
+    "_address",
+    "_group",
+    "_start",
+    "_end",
+    "kind",
+)
+
+
+def get_active_filters(now, window=EVENT_WINDOW):
+    """
+    Filters for the features that are currently on the map
+    """
+    now_date = now.astimezone(timezone.get_current_timezone()).date()
+    return {
+        'group': Q(),
+        'event': Q(
+            # uses the (end, start) index on occurrences
+            event_occurence__end__gte=now,
+            event_occurence__start__lte=now + window,
+        ),
+        'location': (
+            (Q(end=None) | Q(end__gte=now_date))
+            & Q(start__lte=now_date)
+            & Q(duplicate_of=None)
+        ),
+    }
+
+
+def get_collection_querysets(now, window=EVENT_WINDOW):
+    columns = COLLECTION_COLUMNS
+    active = get_active_filters(now, window=window)
+
+    groups = (
+        CollectionGroup.objects.filter(active['group'])
+        .annotate(
+            _address=Value("", output_field=CharField()),
+            _group=Value(None, output_field=IntegerField()),
+            _start=Value(None, output_field=DateTimeField()),
+            _end=Value(None, output_field=DateTimeField()),
+            kind=Value("group", output_field=CharField()),
+        )
+        .values_list(*columns)
+    )
+
+    events = (
+        CollectionEvent.objects.filter(active['event'])
+        .order_by('event_occurence__start')
+        .annotate(
+            _address=Value("", output_field=CharField()),
+            _group=F('group_id'),
+            _start=F('event_occurence__start'),
+            _end=F('event_occurence__end'),
+            kind=Value("event", output_field=CharField()),
+        )
+        .values_list(*columns)
+    )
+    locations = (
+        CollectionLocation.objects.filter(active['location'])
+        .annotate(
+            _address=F('address'),
+            _group=Value(None, output_field=IntegerField()),
+            _start=Value(None, output_field=DateTimeField()),
+            _end=Value(None, output_field=DateTimeField()),
+            kind=Value("location", output_field=CharField())
+        )
+        .values_list(*columns)
+    )
+    return {
+        'group': groups,
+        'event': events,
+        'location': locations,
+    }
+
+
+def get_changed_filters(since, window=EVENT_WINDOW):
+    """
+    Filters for the features that were changed or
+    moved into the map after since
+    """
+    since_date = since.astimezone(timezone.get_current_timezone()).date()
+    return {
+        'group': Q(updated__gt=since),
+        'event': (
+            Q(updated__gt=since)
+            | Q(event_occurence__start__gt=since + window)
+        ),
+        'location': Q(updated__gt=since) | Q(start__gt=since_date),
+    }
+
+
+def get_collection_queryset(now, bbox=None, kinds=COLLECTION_KINDS,
+                            since=None, window=EVENT_WINDOW):
+    querysets = get_collection_querysets(now, window=window)
+    changed = None
+    if since is not None:
+        changed = get_changed_filters(since, window=window)
+    qs_list = []
+    for kind in kinds:
+        qs = querysets[kind]
+        if bbox is not None:
+            # ST_Intersects uses the spatial index on geo
+            qs = qs.filter(geo__intersects=bbox)
+        if changed is not None:
+            qs = qs.filter(changed[kind])
+        qs_list.append(qs)
+    return qs_list[0].union(*qs_list[1:])
+
+
+def get_collection_data(now, bbox=None, kinds=COLLECTION_KINDS,
+                        window=EVENT_WINDOW):
+    qs = get_collection_queryset(now, bbox=bbox, kinds=kinds, window=window)
+    return list(add_details(dict(zip(COLLECTION_COLUMNS, d)) for d in qs))
+
+
+def render_collection_feed_drf(now, bbox=None, kinds=COLLECTION_KINDS,
+                               window=EVENT_WINDOW):
+    data = get_collection_data(now, bbox=bbox, kinds=kinds, window=window)
+    serializer = CollectionSerializer(data, many=True)
+    return JSONRenderer().render(serializer.data)
+
+
+URL_PK_PLACEHOLDER = 987654321
+FEED_START = '{"type":"FeatureCollection","features":['
+FEED_END = ']}'
+FEED_STREAM_CHUNK_SIZE = 2000
+
+FAST_FEED_SQL = """
+SELECT
+    id, name, description,
+    ST_AsGeoJSON(ST_GeomFromEWKB(geo), 15),
+    _address, _group, _start, _end, kind
+FROM ({query}) AS features
+"""
+
+
+def get_url_templates():
+    templates = {}
+    for kind, url_name in ACTION_URLS.items():
+        url = settings.SITE_URL + reverse(
+            url_name, kwargs={'pk': URL_PK_PLACEHOLDER}
+        )
+        templates[kind] = url.replace(str(URL_PK_PLACEHOLDER), '{}')
+    return templates
+
+
+def get_feed_encoder():
+    # Same settings as DRF's JSONRenderer
+    return DRFJSONEncoder(
+        ensure_ascii=False, allow_nan=False, separators=(',', ':')
+    ).encode
+
+
+def iter_feed_features(rows):
+    """
+    Encode rows of FAST_FEED_SQL as GeoJSON feature strings
+    """
+    encode = get_feed_encoder()
+    url_templates = get_url_templates()
+
+    for row in rows:
+        obj = dict(zip(COLLECTION_COLUMNS, row))
+        kind = obj['kind']
+        geometry = obj['geo'] or 'null'
+        properties = {
+            'name': obj['name'],
+            'description': obj['description'],
+            'details': get_details(obj),
+            'kind': kind,
+            'url': url_templates[kind].format(obj['id']),
+        }
+        yield (
+            '{"id":' + encode('{}_{}'.format(kind, obj['id'])) +
+            ',"type":"Feature","geometry":' + geometry +
+            ',"properties":' + encode(properties) + '}'
+        )
+
+
+def encode_feed_chunk(chunk):
+    # DRF's JSONRenderer always escapes these for JavaScript
+    chunk = chunk.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+    return chunk.encode('utf-8')
+
+
+def get_fast_feed_sql(now, bbox=None, kinds=COLLECTION_KINDS, since=None,
+                      window=EVENT_WINDOW):
+    qs = get_collection_queryset(
+        now, bbox=bbox, kinds=kinds, since=since, window=window
+    )
+    query, params = qs.query.sql_with_params()
+    return FAST_FEED_SQL.format(query=query), params
+
+
+def render_collection_feed_fast(now, bbox=None, kinds=COLLECTION_KINDS,
+                                window=EVENT_WINDOW):
+    """
+    Renders the same bytes as render_collection_feed_drf
+    without going through the DRF serializer fields:
+    geometry JSON comes from ST_AsGeoJSON, properties are plain dicts
+    encoded by the C JSON encoder.
+    """
+    sql, params = get_fast_feed_sql(
+        now, bbox=bbox, kinds=kinds, window=window
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    return encode_feed_chunk(
+        FEED_START + ','.join(iter_feed_features(rows)) + FEED_END
+    )
+
+
+def stream_collection_feed(now, bbox=None, kinds=COLLECTION_KINDS,
+                           window=EVENT_WINDOW):
+    """
+    Yields the output of render_collection_feed_fast in chunks
+    while reading rows from a server-side cursor
+    """
+    sql, params = get_fast_feed_sql(
+        now, bbox=bbox, kinds=kinds, window=window
+    )
+    yield encode_feed_chunk(FEED_START)
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        separator = ''
+        while True:
+            rows = cursor.fetchmany(FEED_STREAM_CHUNK_SIZE)
+            if not rows:
+                break
+            yield encode_feed_chunk(
+                separator + ','.join(iter_feed_features(rows))
+            )
+            separator = ','
+    yield encode_feed_chunk(FEED_END)
+
+
+def make_sync_version(now):
+    return '{:.6f}'.format(now.timestamp())
+
+
+def parse_since(value):
+    if not value:
+        return None
+    try:
+        since = datetime.fromtimestamp(float(value), tz=timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        raise ParseError('since must be a {} value'.format(SYNC_VERSION_HEADER))
+    return since - SYNC_SAFETY_MARGIN
+
+
+def get_removed_features(now, since, kinds=COLLECTION_KINDS,
+                         window=EVENT_WINDOW):
+    """
+    Ids of features that left the map after since: deleted (tombstones),
+    changed to be inactive or expired by the time window
+    """
+    active = get_active_filters(now, window=window)
+    tz = timezone.get_current_timezone()
+    now_date = now.astimezone(tz).date()
+    since_date = since.astimezone(tz).date()
+    expired = {
+        'event': Q(
+            event_occurence__end__gte=since,
+            event_occurence__end__lt=now
+        ),
+        'location': Q(end__gte=since_date, end__lt=now_date),
+    }
+
+    removed = set()
+    for kind in kinds:
+        if kind not in expired:
+            # groups only leave the map when deleted
+            continue
+        ids = COLLECTION_MODELS[kind].objects.filter(
+            (Q(updated__gt=since) & ~active[kind]) | expired[kind]
+        ).values_list('id', flat=True)
+        removed.update('{}_{}'.format(kind, pk) for pk in ids)
+
+    tombstones = CollectionTombstone.objects.filter(
+        removed__gt=since, kind__in=kinds
+    ).values_list('kind', 'object_id')
+    removed.update('{}_{}'.format(kind, pk) for kind, pk in tombstones)
+    return sorted(removed)
+
+
+def render_collection_delta(now, since, bbox=None, kinds=COLLECTION_KINDS,
+                            window=EVENT_WINDOW):
+    """
+    FeatureCollection of features changed or added after since
+    with ids of removed features and the new sync version
+    """
+    sql, params = get_fast_feed_sql(
+        now, bbox=bbox, kinds=kinds, since=since, window=window
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    encode = get_feed_encoder()
+    removed = get_removed_features(now, since, kinds=kinds, window=window)
+    return encode_feed_chunk(
+        FEED_START + ','.join(iter_feed_features(rows)) +
+        '],"removed":' + encode(removed) +
+        ',"version":' + encode(make_sync_version(now)) + '}'
+    )
+
+
+def render_collection_feed(now, bbox=None, kinds=COLLECTION_KINDS):
+    if settings.COLLECTION_FEED_FAST_SERIALIZER:
+        return render_collection_feed_fast(now, bbox=bbox, kinds=kinds)
+    return render_collection_feed_drf(now, bbox=bbox, kinds=kinds)
+
+
+def get_local_midnight(now, days=0):
+    tz = timezone.get_current_timezone()
+    date = now.astimezone(tz).date() + timedelta(days=days)
+    return tz.localize(datetime.combine(date, time.min))
+
+
+COLLECTION_VERSION_SQL = """
+SELECT
+    (SELECT max(updated) FROM {group}), (SELECT count(*) FROM {group}),
+    (SELECT max(updated) FROM {location}), (SELECT count(*) FROM {location}),
+    (SELECT max(updated) FROM {event}), (SELECT count(*) FROM {event}),
+    (SELECT max(o."end") FROM {event} e JOIN {occurrence} o
+        ON e.event_occurence_id = o.id WHERE o."end" < %s),
+    (SELECT max(o."start") FROM {event} e JOIN {occurrence} o
+        ON e.event_occurence_id = o.id WHERE o."start" <= %s)
+"""
+
+
+def query_collection_version(now, window=EVENT_WINDOW):
+    """
+    Returns (version, last_modified) of the collection feed from one
+    aggregate query: latest update and row count per table (counts catch
+    deletions) and the latest event that left or entered the time window.
+    """
+    qn = connection.ops.quote_name
+    sql = COLLECTION_VERSION_SQL.format(
+        group=qn(CollectionGroup._meta.db_table),
+        location=qn(CollectionLocation._meta.db_table),
+        event=qn(CollectionEvent._meta.db_table),
+        occurrence=qn(Occurrence._meta.db_table),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [now, now + window])
+        row = cursor.fetchone()
+
+    (group_updated, _, location_updated, _,
+     event_updated, _, last_event_end, last_event_start) = row
+    midnight = get_local_midnight(now)
+    timestamps = [
+        group_updated, location_updated, event_updated,
+        last_event_end, midnight
+    ]
+    if last_event_start is not None:
+        timestamps.append(last_event_start - window)
+    last_modified = max(t for t in timestamps if t is not None)
+
+    version = hashlib.md5(
+        repr((row, midnight)).encode('utf-8')
+    ).hexdigest()
+    return version, last_modified
+
+
+def get_collection_version(now, window=EVENT_WINDOW):
+    if window != EVENT_WINDOW:
+        return query_collection_version(now, window=window)
+    version = cache.get(COLLECTION_VERSION_CACHE_KEY)
+    if version is None:
+        version = query_collection_version(now)
+        cache.set(
+            COLLECTION_VERSION_CACHE_KEY, version,
+            get_feed_timeout(now)
+        )
+    return version
+
+
+def get_feed_timeout(now):
+    """
+    Seconds until the feed changes without any model change:
+    the next local midnight (locations start/end by date),
+    the first event in the window that ends and
+    the next event that moves into the window.
+    """
+    boundaries = [
+        get_local_midnight(now, days=1),
+        now + timedelta(seconds=settings.COLLECTION_FEED_CACHE_TIMEOUT)
+    ]
+
+    next_end = CollectionEvent.objects.filter(
+        event_occurence__end__gte=now,
+        event_occurence__start__lte=now + EVENT_WINDOW,
+    ).aggregate(next_end=Min('event_occurence__end'))['next_end']
+    if next_end is not None:
+        boundaries.append(next_end)
+
+    next_start = CollectionEvent.objects.filter(
+        event_occurence__start__gt=now + EVENT_WINDOW
+    ).aggregate(next_start=Min('event_occurence__start'))['next_start']
+    if next_start is not None:
+        boundaries.append(next_start - EVENT_WINDOW)
+
+    timeout = (min(boundaries) - now).total_seconds()
+    return max(int(timeout), 1)
+
+
+def update_collection_feed():
+    """
+    Renders the full feed into the cache and
+    returns (sync version, feed bytes)
+    """
+    now = timezone.now()
+    version = query_collection_version(now)
+    feed = (make_sync_version(now), render_collection_feed(now))
+    timeout = get_feed_timeout(now)
+    cache.set_many({
+        COLLECTION_VERSION_CACHE_KEY: version,
+        COLLECTION_FEED_CACHE_KEY: feed,
+    }, timeout)
+    return feed
+
+
+def get_collection_feed():
+    feed = cache.get(COLLECTION_FEED_CACHE_KEY)
+    if feed is None:
+        feed = update_collection_feed()
+    return feed
+
+
+def clear_collection_feed():
+    cache.delete_many([
+        COLLECTION_FEED_CACHE_KEY, COLLECTION_VERSION_CACHE_KEY
+    ])
+    try:
+        cache.incr(COLLECTION_CACHE_VERSION_KEY)
+    except ValueError:
+        # nothing cached yet
+        pass
+
+
+def get_collection_cache_version():
+    """
+    Version of derived caches (tiles, clusters),
+    bumped by clear_collection_feed
+    """
+    return cache.get_or_set(COLLECTION_CACHE_VERSION_KEY, 1, None)
+
+
+def parse_bbox(value):
+    """
+    Parse bbox query parameter of the form min_lng,min_lat,max_lng,max_lat
+    """
+    if not value:
+        return None
+    try:
+        coords = [float(x) for x in value.split(',')]
+    except ValueError:
+        coords = []
+    if len(coords) != 4:
+        raise ParseError('bbox must be min_lng,min_lat,max_lng,max_lat')
+    bbox = Polygon.from_bbox(coords)
+    bbox.srid = 4326
+    return bbox
+
+
+def parse_kinds(value):
+    if not value:
+        return COLLECTION_KINDS
+    kinds = set(value.split(','))
+    if not kinds.issubset(COLLECTION_KINDS):
+        raise ParseError('kind must be one of {}'.format(
+            ', '.join(COLLECTION_KINDS)
+        ))
+    return tuple(k for k in COLLECTION_KINDS if k in kinds)
+
+
+def parse_zoom(value):
+    if not value:
+        return None
+    try:
+        zoom = int(value)
+    except ValueError:
+        zoom = -1
+    if not 0 <= zoom <= MAX_TILE_ZOOM:
+        raise ParseError('zoom must be between 0 and {}'.format(MAX_TILE_ZOOM))
+    return zoom
+
+
+def parse_window(value):
+    if not value:
+        return EVENT_WINDOW
+    max_days = settings.COLLECTION_EVENT_WINDOW_MAX_DAYS
+    try:
+        days = int(value)
+    except ValueError:
+        days = -1
+    if not 1 <= days <= max_days:
+        raise ParseError('days must be between 1 and {}'.format(max_days))
+    return timedelta(days=days)
+
+
 class CollectionViewSet(viewsets.ViewSet):
     def list(self, request):
-        # WARNING: only change order with care
-        # https://code.djangoproject.com/ticket/28553
-        columns = (
-            "id", "name",
-            "description", "geo",
-            "_address",
-            "_group",
-            "_start",
-            "_end",
-            "kind",
+        bbox = parse_bbox(request.query_params.get('bbox'))
+        kinds = parse_kinds(request.query_params.get('kind'))
+        zoom = parse_zoom(request.query_params.get('zoom'))
+        since = parse_since(request.query_params.get('since'))
+        window = parse_window(request.query_params.get('days'))
+
+        version, last_modified = get_collection_version(
+            timezone.now(), window=window
         )
+        etag = quote_etag(hashlib.md5(
+            (version + request.query_params.urlencode()).encode('utf-8')
+        ).hexdigest())
+        last_modified = int(last_modified.timestamp())
 
-        groups = (
-            CollectionGroup.objects.all()
-            .annotate(
-                _address=Value("", output_field=CharField()),
-                _group=Value(None, output_field=IntegerField()),
-                _start=Value(None, output_field=DateTimeField()),
-                _end=Value(None, output_field=DateTimeField()),
-                kind=Value("group", output_field=CharField()),
-            )
-            .values_list(*columns)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
         )
+        if response is None:
+            response = self.get_feed_response(
+                bbox, kinds, zoom, since, window
+            )
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
 
+    def get_feed_response(self, bbox, kinds, zoom, since, window):
+        """
+        Full feed responses carry the sync version for later
+        ?since= requests in a header. Delta responses have it in
+        their body next to the removed feature ids. Requests with a since
+        older than COLLECTION_SYNC_MAX_AGE get the full feed.
+        """
         now = timezone.now()
-        now_date = now.astimezone(timezone.get_current_timezone()).date()
-        two_weeks = now + timedelta(days=15)
-        events = (
-            CollectionEvent.objects.filter(
-                event_occurence__end__gte=now,
-                event_occurence__start__lte=two_weeks,
-            ).order_by('event_occurence__start')
-            .annotate(
-                _address=Value("", output_field=CharField()),
-                _group=F('group_id'),
-                _start=F('event_occurence__start'),
-                _end=F('event_occurence__end'),
-                kind=Value("event", output_field=CharField()),
+        sync_version = make_sync_version(now)
+        if zoom is not None and zoom <= settings.COLLECTION_CLUSTER_MAX_ZOOM:
+            feed = get_collection_clusters(
+                zoom, bbox=bbox, kinds=kinds, window=window
             )
-            .values_list(*columns)
-        )
-        locations = (
-            CollectionLocation.objects.filter(
-                (Q(end=None) | Q(end__gte=now_date))
-                & Q(start__lte=now_date)
+        elif since is not None and since > now - timedelta(
+                seconds=settings.COLLECTION_SYNC_MAX_AGE):
+            feed = render_collection_delta(
+                now, since, bbox=bbox, kinds=kinds, window=window
             )
-            .annotate(
-                _address=F('address'),
-                _group=Value(None, output_field=IntegerField()),
-                _start=Value(None, output_field=DateTimeField()),
-                _end=Value(None, output_field=DateTimeField()),
-                kind=Value("location", output_field=CharField())
+        elif (bbox is None and kinds == COLLECTION_KINDS and
+                window == EVENT_WINDOW):
+            sync_version, feed = get_collection_feed()
+        else:
+            response = self.get_uncached_response(now, bbox, kinds, window)
+            response[SYNC_VERSION_HEADER] = sync_version
+            return response
+
+        response = HttpResponse(feed, content_type='application/json')
+        response[SYNC_VERSION_HEADER] = sync_version
+        return response
+
+    def get_uncached_response(self, now, bbox, kinds, window):
+        if settings.COLLECTION_FEED_FAST_SERIALIZER:
+            return StreamingHttpResponse(
+                stream_collection_feed(
+                    now, bbox=bbox, kinds=kinds, window=window
+                ),
+                content_type='application/json'
             )
-            .values_list(*columns)
+        return HttpResponse(
+            render_collection_feed_drf(
+                now, bbox=bbox, kinds=kinds, window=window
+            ),
+            content_type='application/json'
+        )
+
+
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+MAX_TILE_ZOOM = 20
+WEB_MERCATOR_HALF = 20037508.342789244
+
+MVT_SQL = """
+WITH features AS ({query})
+SELECT ST_AsMVT(tile, 'collection', {extent}, 'geom') FROM (
+    SELECT
+        kind || '_' || id AS "id", kind, name,
+        _address AS "address", _group AS "group",
+        _start::text AS "start", _end::text AS "end",
+        ST_AsMVTGeom(
+            ST_Transform(ST_GeomFromEWKB(geo), 3857),
+            ST_MakeEnvelope(%s, %s, %s, %s, 3857),
+            {extent}, {buffer}, true
+        ) AS geom
+    FROM features
+) AS tile WHERE geom IS NOT NULL
+"""
+
+
+def get_tile_mercator_bounds(z, x, y):
+    size = 2 * WEB_MERCATOR_HALF / 2 ** z
+    min_x = -WEB_MERCATOR_HALF + x * size
+    max_y = WEB_MERCATOR_HALF - y * size
+    return (min_x, max_y - size, min_x + size, max_y)
+
+
+def get_tile_bbox(z, x, y):
+    """
+    Tile bounds plus MVT buffer as lng/lat polygon
+    for the spatial index filter
+    """
+    n = 2 ** z
+    buffer = MVT_BUFFER / MVT_EXTENT
+
+    def lng(tx):
+        return tx / n * 360.0 - 180.0
+
+    def lat(ty):
+        ty = min(max(ty, 0), n)
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    bbox = Polygon.from_bbox((
+        max(lng(x - buffer), -180.0), lat(y + 1 + buffer),
+        min(lng(x + 1 + buffer), 180.0), lat(y - buffer),
+    ))
+    bbox.srid = 4326
+    return bbox
+
+
+def render_collection_tile(z, x, y):
+    qs = get_collection_queryset(timezone.now(), bbox=get_tile_bbox(z, x, y))
+    query, params = qs.query.sql_with_params()
+    sql = MVT_SQL.format(query=query, extent=MVT_EXTENT, buffer=MVT_BUFFER)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, tuple(params) + get_tile_mercator_bounds(z, x, y))
+        tile = cursor.fetchone()[0]
+    if tile is None:
+        return b''
+    return bytes(tile)
+
+
+def get_collection_tile(z, x, y):
+    key = COLLECTION_TILE_CACHE_KEY.format(
+        version=get_collection_cache_version(), z=z, x=x, y=y
+    )
+    tile = cache.get(key)
+    if tile is None:
+        tile = render_collection_tile(z, x, y)
+        cache.set(key, tile, get_feed_timeout(timezone.now()))
+    return tile
+
+
+def collection_tile(request, z, x, y):
+    if z > MAX_TILE_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        raise Http404
+    response = HttpResponse(
+        get_collection_tile(z, x, y),
+        content_type='application/vnd.mapbox-vector-tile'
+    )
+    patch_cache_control(
+        response, public=True, max_age=settings.COLLECTION_TILE_MAX_AGE
+    )
+    return response
+
+
+CLUSTER_GRID_PIXELS = 80
+
+CLUSTER_SQL = """
+WITH features AS ({query})
+SELECT
+    ST_X(center), ST_Y(center), count, groups, events, locations
+FROM (
+    SELECT
+        ST_Transform(ST_Centroid(ST_Collect(geom)), 4326) AS center,
+        count(*) AS count,
+        count(*) FILTER (WHERE kind = 'group') AS groups,
+        count(*) FILTER (WHERE kind = 'event') AS events,
+        count(*) FILTER (WHERE kind = 'location') AS locations
+    FROM (
+        SELECT kind, ST_Transform(ST_GeomFromEWKB(geo), 3857) AS geom
+        FROM features WHERE geo IS NOT NULL
+    ) AS projected
+    GROUP BY ST_SnapToGrid(geom, %s)
+) AS clusters
+ORDER BY count DESC
+"""
+
+
+def get_cluster_grid_size(zoom):
+    """
+    Grid cell size in web mercator meters for CLUSTER_GRID_PIXELS
+    on 256px tiles at zoom
+    """
+    return 2 * WEB_MERCATOR_HALF / (256 * 2 ** zoom) * CLUSTER_GRID_PIXELS
+
+
+def render_collection_clusters(zoom, bbox=None, kinds=COLLECTION_KINDS,
+                               window=EVENT_WINDOW):
+    qs = get_collection_queryset(
+        timezone.now(), bbox=bbox, kinds=kinds, window=window
+    )
+    query, params = qs.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            CLUSTER_SQL.format(query=query),
+            tuple(params) + (get_cluster_grid_size(zoom),)
         )
-        qs = groups.union(events).union(locations)
+        rows = cursor.fetchall()
+
+    features = []
+    for i, (lng, lat, count, groups, events, locations) in enumerate(rows):
+        features.append(OrderedDict((
+            ('id', 'cluster_{}_{}'.format(zoom, i)),
+            ('type', 'Feature'),
+            ('geometry', {'type': 'Point', 'coordinates': [lng, lat]}),
+            ('properties', OrderedDict((
+                ('name', ''),
+                ('description', ''),
+                ('details', {
+                    'count': count,
+                    'kinds': {
+                        'group': groups,
+                        'event': events,
+                        'location': locations,
+                    }
+                }),
+                ('kind', 'cluster'),
+                ('url', ''),
+            ))),
+        )))
+    return JSONRenderer().render(OrderedDict((
+        ('type', 'FeatureCollection'),
+        ('features', features),
+    )))
+
+
+def get_collection_clusters(zoom, bbox=None, kinds=COLLECTION_KINDS,
+                            window=EVENT_WINDOW):
+    if (bbox is not None or kinds != COLLECTION_KINDS or
+            window != EVENT_WINDOW):
+        return render_collection_clusters(
+            zoom, bbox=bbox, kinds=kinds, window=window
+        )
+
+    key = COLLECTION_CLUSTER_CACHE_KEY.format(
+        version=get_collection_cache_version(), zoom=zoom
+    )
+    clusters = cache.get(key)
+    if clusters is None:
+        clusters = render_collection_clusters(zoom)
+        # expire with the feed, when events end or enter the window
+        cache.set(key, clusters, get_feed_timeout(timezone.now()))
+    return clusters
+
+
+HEATMAP_SIZES = (250, 500, 1000, 2000, 5000)
+HEATMAP_DEFAULT_SIZE = 1000
+
+# Flat topped hexagons in web mercator, columns are 1.5 sizes apart and
+# every other column is shifted by half a row. Results on a shared edge
+# count for one hexagon only.
+HEATMAP_SQL = """
+WITH results AS (
+    SELECT result.id, result.amount, ST_Transform(COALESCE(
+        location.geo, event.geo, team.geo
+    )::geometry, 3857) AS geom
+    FROM {result_table} AS result
+    LEFT JOIN {location_table} AS location ON location.id = result.location_id
+    LEFT JOIN {event_table} AS event ON event.id = result.event_id
+    LEFT JOIN {group_table} AS team ON team.id = result.group_id
+    WHERE COALESCE(location.geo, event.geo, team.geo) IS NOT NULL{where}
+), origin AS (
+    SELECT ST_X(corner) AS x0, ST_Y(corner) AS y0 FROM (
+        SELECT ST_Transform(
+            ST_SetSRID(ST_MakePoint(%(origin_x)s, %(origin_y)s), 4326), 3857
+        ) AS corner
+    ) AS extent
+), offsets AS (
+    SELECT results.amount,
+        ST_X(results.geom) - origin.x0 AS x,
+        ST_Y(results.geom) - origin.y0 AS y
+    FROM results CROSS JOIN origin
+), candidates AS (
+    -- hexagon centers form two rectangular lattices,
+    -- even columns and odd columns shifted by half a hexagon
+    SELECT amount, x, y,
+        round(x / (3 * %(size)s)) AS even_col,
+        round(y / (sqrt(3) * %(size)s)) AS even_row,
+        round(x / (3 * %(size)s) - 0.5) AS odd_col,
+        round(y / (sqrt(3) * %(size)s) - 0.5) AS odd_row
+    FROM offsets
+), distances AS (
+    SELECT amount, even_col, even_row, odd_col, odd_row,
+        (x - 3 * %(size)s * even_col) ^ 2 +
+        (y - sqrt(3) * %(size)s * even_row) ^ 2 AS even_dist,
+        (x - 3 * %(size)s * (odd_col + 0.5)) ^ 2 +
+        (y - sqrt(3) * %(size)s * (odd_row + 0.5)) ^ 2 AS odd_dist
+    FROM candidates
+), binned AS (
+    -- the nearest center is the center of the hexagon containing the point
+    SELECT amount,
+        (CASE WHEN even_dist <= odd_dist
+            THEN 2 * even_col ELSE 2 * odd_col + 1 END)::integer AS hex_col,
+        (CASE WHEN even_dist <= odd_dist
+            THEN even_row ELSE odd_row END)::integer AS hex_row
+    FROM distances
+)
+SELECT
+    ST_AsGeoJSON(ST_Transform(ST_Translate(
+        ST_GeomFromText(%(hexagon)s, 3857),
+        origin.x0 + hex_col * 1.5 * %(size)s,
+        origin.y0 + (hex_row + (hex_col & 1) * 0.5) * sqrt(3) * %(size)s
+    ), 4326), 6),
+    sum(amount), count(*)
+FROM binned CROSS JOIN origin
+GROUP BY hex_col, hex_row, origin.x0, origin.y0
+ORDER BY hex_col, hex_row
+"""
+
+
+def get_hexagon_wkt(size):
+    angles = [math.radians(60 * i) for i in range(7)]
+    return 'POLYGON(({}))'.format(', '.join(
+        '{} {}'.format(size * math.cos(a), size * math.sin(a)) for a in angles
+    ))
+
+
+def render_collection_heatmap(start=None, end=None,
+                              size=HEATMAP_DEFAULT_SIZE):
+    """
+    Hex binned sum of collected signatures with results between
+    start and end date, size is the hexagon radius in meters
+    """
+    qn = connection.ops.quote_name
+    tz = timezone.get_current_timezone()
+    # web mercator is stretched by 1 / cos(latitude)
+    center_lat = settings.LEAFLET_CONFIG['DEFAULT_CENTER'][0]
+    mercator_size = size / math.cos(math.radians(center_lat))
+    # the grid starts at the map extent corner, so hexagons stay in
+    # place between requests and date ranges
+    extent = settings.LEAFLET_CONFIG['SPATIAL_EXTENT']
+    params = {
+        'hexagon': get_hexagon_wkt(mercator_size),
+        'size': mercator_size,
+        'origin_x': extent[0],
+        'origin_y': extent[1],
+    }
+    where = ''
+    if start is not None:
+        where += ' AND COALESCE(result."start", result."end") >= %(start)s'
+        params['start'] = timezone.make_aware(
+            datetime.combine(start, time()), tz
+        )
+    if end is not None:
+        where += ' AND COALESCE(result."start", result."end") < %(end)s'
+        params['end'] = timezone.make_aware(
+            datetime.combine(end + timedelta(days=1), time()), tz
+        )
+    sql = HEATMAP_SQL.format(
+        result_table=qn(CollectionResult._meta.db_table),
+        location_table=qn(CollectionLocation._meta.db_table),
+        event_table=qn(CollectionEvent._meta.db_table),
+        group_table=qn(CollectionGroup._meta.db_table),
+        where=where
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    features = []
+    for geometry, amount, count in rows:
+        features.append(OrderedDict((
+            ('type', 'Feature'),
+            ('geometry', json.loads(geometry)),
+            ('properties', OrderedDict((
+                ('amount', amount),
+                ('count', count),
+            ))),
+        )))
+    return JSONRenderer().render(OrderedDict((
+        ('type', 'FeatureCollection'),
+        ('features', features),
+    )))
+
+
+def get_collection_heatmap(start=None, end=None, size=HEATMAP_DEFAULT_SIZE):
+    version = cache.get_or_set(COLLECTION_HEATMAP_VERSION_KEY, 1, None)
+    key = COLLECTION_HEATMAP_CACHE_KEY.format(
+        version=version, start=start, end=end, size=size
+    )
+    heatmap = cache.get(key)
+    if heatmap is None:
+        heatmap = render_collection_heatmap(start=start, end=end, size=size)
+        cache.set(key, heatmap, settings.COLLECTION_FEED_CACHE_TIMEOUT)
+    return heatmap
+
 
-        qs = list(add_details(dict(zip(columns, d)) for d in qs))
+def clear_collection_heatmap():
+    try:
+        cache.incr(COLLECTION_HEATMAP_VERSION_KEY)
+    except ValueError:
+        # nothing cached yet
+        pass
 
-        serializer = CollectionSerializer(qs, many=True)
-        return Response(serializer.data)
+
+def parse_heatmap_date(value, name):
+    if not value:
+        return None
+    try:
+        date = parse_date(value)
+    except ValueError:
+        date = None
+    if date is None:
+        raise ParseError('{} must be a YYYY-MM-DD date'.format(name))
+    return date
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def collection_heatmap(request):
+    start = parse_heatmap_date(request.query_params.get('start'), 'start')
+    end = parse_heatmap_date(request.query_params.get('end'), 'end')
+    try:
+        size = int(request.query_params.get('size', HEATMAP_DEFAULT_SIZE))
+    except ValueError:
+        size = None
+    if size not in HEATMAP_SIZES:
+        raise ParseError('size must be one of {}'.format(
+            ', '.join(str(s) for s in HEATMAP_SIZES)
+        ))
+    return HttpResponse(
+        get_collection_heatmap(start=start, end=end, size=size),
+        content_type='application/json'
+    )
+
+
+SEARCH_MAX_RESULTS = 20
+
+
+def search_collection(now, query, limit=SEARCH_MAX_RESULTS):
+    """
+    Best matching teams and active places, ranked by full text rank
+    plus trigram similarity
+    """
+    querysets = get_collection_querysets(now)
+    rows = []
+    for kind in ('group', 'location'):
+        model = COLLECTION_MODELS[kind]
+        rows.extend(
+            querysets[kind]
+            .filter(get_search_filter(model, query))
+            .annotate(search_score=get_search_score(model, query))
+            .order_by('-search_score')[:limit]
+        )
+    # the score comes after COLLECTION_COLUMNS
+    rows.sort(key=lambda row: row[-1], reverse=True)
+    return list(add_details(
+        dict(zip(COLLECTION_COLUMNS, row)) for row in rows[:limit]
+    ))
+
+
+@api_view(['GET'])
+def collection_search(request):
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        raise ParseError('q must not be empty')
+    data = search_collection(timezone.now(), query)
+    serializer = CollectionSerializer(data, many=True)
+    return HttpResponse(
+        JSONRenderer().render(serializer.data),
+        content_type='application/json'
+    )
+
+
+class CollectionTerritorySerializer(GeoFeatureModelSerializer):
+    name = serializers.CharField(source='group.name')
+    url = serializers.SerializerMethodField(read_only=True)
+
+    class Meta:
+        model = CollectionTerritory
+        geo_field = 'geo'
+        fields = ('id', 'group', 'name', 'url')
+
+    def get_url(self, obj):
+        return settings.SITE_URL + reverse(
+            ACTION_URLS['group'], kwargs={'pk': obj.group_id}
+        )
+
+
+class CollectionTerritoryViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Team territories as a map layer
+    """
+    queryset = CollectionTerritory.objects.select_related('group')
+    serializer_class = CollectionTerritorySerializer
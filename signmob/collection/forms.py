@@ -88,12 +88,17 @@ class CollectionLocationForm(forms.ModelForm):
 
         # only needs check if non-staff created it
         obj.needs_check = not request.user.is_authenticated
+        # repeated submissions of the same place stay off the map
+        obj.duplicate_of = CollectionLocation.objects.find_duplicate(obj)
+        if obj.duplicate_of is not None:
+            obj.needs_check = True
         obj.save()
 
-        location_created.send(
-            sender=obj.__class__,
-            location=obj,
-        )
+        if obj.duplicate_of is None:
+            location_created.send(
+                sender=obj.__class__,
+                location=obj,
+            )
 
         return obj
 
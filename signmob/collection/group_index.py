@@ -0,0 +1,199 @@
+"""
+In-process nearest team lookup
+
+Worker processes keep all team points in a KD-tree and only go to the
+database when the index version in the cache changes.
+"""
+import copy
+import math
+import uuid
+
+from django.core.cache import cache
+
+from .models import CollectionGroup
+
+GROUP_INDEX_VERSION_KEY = 'collection:group-index-version'
+
+# WGS 84, the spheroid PostGIS uses for geography distances
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+# great circle distances on the unit sphere are within this factor
+# of the distances on the spheroid
+SPHEROID_TOLERANCE = 1.02
+
+_group_index = None
+
+
+def geodesic_distance(lng1, lat1, lng2, lat2):
+    """
+    Distance in meters on the WGS 84 spheroid (Vincenty's inverse formula),
+    matches ST_Distance on geography to well below a millimeter
+    """
+    if lng1 == lng2 and lat1 == lat2:
+        return 0.0
+    lng_diff = math.radians(lng2 - lng1)
+    u1 = math.atan((1 - WGS84_F) * math.tan(math.radians(lat1)))
+    u2 = math.atan((1 - WGS84_F) * math.tan(math.radians(lat2)))
+    sin_u1, cos_u1 = math.sin(u1), math.cos(u1)
+    sin_u2, cos_u2 = math.sin(u2), math.cos(u2)
+
+    lam = lng_diff
+    for _ in range(200):
+        sin_lam, cos_lam = math.sin(lam), math.cos(lam)
+        sin_sigma = math.hypot(
+            cos_u2 * sin_lam,
+            cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam
+        )
+        if sin_sigma == 0:
+            return 0.0
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+        sigma = math.atan2(sin_sigma, cos_sigma)
+        sin_alpha = cos_u1 * cos_u2 * sin_lam / sin_sigma
+        cos2_alpha = 1 - sin_alpha ** 2
+        if cos2_alpha:
+            cos_2sigma_m = cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha
+        else:
+            # both points on the equator
+            cos_2sigma_m = 0.0
+        c = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+        lam_prev = lam
+        lam = lng_diff + (1 - c) * WGS84_F * sin_alpha * (
+            sigma + c * sin_sigma * (
+                cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+            )
+        )
+        if abs(lam - lam_prev) < 1e-12:
+            break
+
+    u_sq = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = b * sin_sigma * (
+        cos_2sigma_m + b / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) -
+            b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) *
+            (-3 + 4 * cos_2sigma_m ** 2)
+        )
+    )
+    return WGS84_B * a * (sigma - delta_sigma)
+
+
+def to_unit_vector(lng, lat):
+    lng, lat = math.radians(lng), math.radians(lat)
+    return (
+        math.cos(lat) * math.cos(lng),
+        math.cos(lat) * math.sin(lng),
+        math.sin(lat)
+    )
+
+
+def square_distance(a, b):
+    return sum((x - y) ** 2 for x, y in zip(a, b))
+
+
+def build_kdtree(points, depth=0):
+    """
+    points is a list of (unit vector, item),
+    nodes are (point, item, axis, left, right)
+    """
+    if not points:
+        return None
+    axis = depth % 3
+    points = sorted(points, key=lambda p: p[0][axis])
+    median = len(points) // 2
+    point, item = points[median]
+    return (
+        point, item, axis,
+        build_kdtree(points[:median], depth + 1),
+        build_kdtree(points[median + 1:], depth + 1)
+    )
+
+
+def find_nearest(node, target, best=None):
+    """
+    Returns the smallest square chord distance to target
+    """
+    if node is None:
+        return best
+    point, _, axis, left, right = node
+    dist = square_distance(point, target)
+    if best is None or dist < best:
+        best = dist
+    diff = target[axis] - point[axis]
+    near, far = (left, right) if diff < 0 else (right, left)
+    best = find_nearest(near, target, best)
+    if diff ** 2 < best:
+        best = find_nearest(far, target, best)
+    return best
+
+
+def find_within(node, target, max_dist, result):
+    if node is None:
+        return result
+    point, item, axis, left, right = node
+    if square_distance(point, target) <= max_dist:
+        result.append(item)
+    diff = target[axis] - point[axis]
+    if diff < 0 or diff ** 2 <= max_dist:
+        find_within(left, target, max_dist, result)
+    if diff >= 0 or diff ** 2 <= max_dist:
+        find_within(right, target, max_dist, result)
+    return result
+
+
+class GroupIndex:
+    def __init__(self, groups, version=None):
+        self.version = version
+        self.tree = build_kdtree([
+            (to_unit_vector(group.geo.x, group.geo.y), group)
+            for group in groups if group.geo
+        ])
+
+    def get_closest(self, geo):
+        """
+        Nearest team by geodesic distance, like
+        CollectionGroupManager.get_closest with distance in meters
+        """
+        if not geo or self.tree is None:
+            return None
+        target = to_unit_vector(geo.x, geo.y)
+        nearest = find_nearest(self.tree, target)
+        # the nearest on the sphere need not be the nearest on the spheroid
+        max_dist = nearest * SPHEROID_TOLERANCE ** 2 + 1e-18
+        candidates = find_within(self.tree, target, max_dist, [])
+        distance, group = min(
+            ((geodesic_distance(geo.x, geo.y, g.geo.x, g.geo.y), g)
+             for g in candidates),
+            key=lambda c: (c[0], c[1].id)
+        )
+        group = copy.copy(group)
+        group.distance = distance
+        return group
+
+
+def get_group_index_version():
+    version = cache.get(GROUP_INDEX_VERSION_KEY)
+    if version is None:
+        # new token when the key was never set or evicted
+        version = uuid.uuid4().hex
+        cache.add(GROUP_INDEX_VERSION_KEY, version, None)
+        version = cache.get(GROUP_INDEX_VERSION_KEY, version)
+    return version
+
+
+def bump_group_index_version():
+    cache.set(GROUP_INDEX_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def get_group_index():
+    """
+    Loads the index on first use and again after a team changed
+    """
+    global _group_index
+    version = get_group_index_version()
+    if _group_index is None or _group_index.version != version:
+        _group_index = GroupIndex(
+            CollectionGroup.objects.exclude(geo=None), version=version
+        )
+    return _group_index
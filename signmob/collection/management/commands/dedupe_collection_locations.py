@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from signmob.collection.models import CollectionLocation
+from signmob.collection.notifications import collection_feed_changed
+
+
+class Command(BaseCommand):
+    help = "Flags collection places that duplicate an older place"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only list the duplicates'
+        )
+
+    def handle(self, *args, **options):
+        locations = CollectionLocation.objects.filter(
+            duplicate_of=None, geo__isnull=False
+        ).order_by('id')
+        flagged = set()
+        for location in locations.iterator():
+            if location.id in flagged:
+                continue
+            duplicates = CollectionLocation.objects.get_duplicates(
+                location
+            ).filter(duplicate_of=None, id__gt=location.id)
+            ids = set(duplicates.values_list('id', flat=True)) - flagged
+            if not ids:
+                continue
+            self.stdout.write('{} ({}): {}'.format(
+                location, location.id, ', '.join(str(i) for i in sorted(ids))
+            ))
+            flagged |= ids
+            if not options['dry_run']:
+                CollectionLocation.objects.filter(id__in=ids).update(
+                    duplicate_of=location, needs_check=True,
+                    updated=timezone.now()
+                )
+
+        self.stdout.write('Found {} duplicates'.format(len(flagged)))
+        if flagged and not options['dry_run']:
+            collection_feed_changed()
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from signmob.collection.models import CollectionLocation
+from signmob.collection.routes import (
+    export_route_csv, export_route_gpx, get_delivery_route,
+    get_pending_locations
+)
+
+EXPORTERS = {
+    'csv': export_route_csv,
+    'gpx': export_route_gpx,
+}
+
+
+class Command(BaseCommand):
+    help = "Writes a delivery route for all places waiting for material"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', choices=sorted(EXPORTERS), default='csv'
+        )
+        parser.add_argument(
+            '--output', help='File to write to (default: stdout)'
+        )
+
+    def handle(self, *args, **options):
+        locations = get_pending_locations(CollectionLocation.objects.all())
+        route = get_delivery_route(locations)
+        data = EXPORTERS[options['format']](route)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(data)
+            self.stderr.write('Wrote {} stops'.format(len(route)))
+        else:
+            self.stdout.write(data, ending='')
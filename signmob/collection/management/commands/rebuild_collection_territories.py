@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from signmob.collection.models import CollectionTerritory
+
+
+class Command(BaseCommand):
+    help = "Recomputes the team territories from the team locations"
+
+    def handle(self, *args, **options):
+        count = CollectionTerritory.objects.rebuild()
+        self.stdout.write('Built {} team territories'.format(count))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from signmob.collection.models import CollectionLocation
+
+
+class Command(BaseCommand):
+    help = "Recomputes the closest team of all collection places"
+
+    def handle(self, *args, **options):
+        count = CollectionLocation.objects.update_closest_group()
+        self.stdout.write('Updated {} collection places'.format(count))
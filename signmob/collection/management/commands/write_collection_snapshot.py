@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from signmob.collection.snapshot import write_collection_snapshot
+
+
+class Command(BaseCommand):
+    help = "Writes the collection feed to a pre-compressed snapshot file"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--root', default=settings.COLLECTION_SNAPSHOT_ROOT,
+            help='Snapshot directory (default: COLLECTION_SNAPSHOT_ROOT)'
+        )
+
+    def handle(self, *args, **options):
+        if not options['root']:
+            raise CommandError('COLLECTION_SNAPSHOT_ROOT is not set')
+        name = write_collection_snapshot(options['root'])
+        self.stdout.write('Wrote {}'.format(name))
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from whitenoise.base import WhiteNoise
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.string_utils import ensure_leading_trailing_slash
+
+from .snapshot import SNAPSHOT_VERSION_RE
+
+
+class CollectionSnapshotMiddleware(WhiteNoiseMiddleware):
+    """
+    Serves the collection feed snapshot written by write_collection_snapshot
+    with WhiteNoise. The files change at runtime, so they are looked up
+    per request like in WhiteNoise's autorefresh mode.
+    """
+
+    def __init__(self, get_response=None, settings=settings):
+        if not settings.COLLECTION_SNAPSHOT_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.configure_from_settings(settings)
+        WhiteNoise.__init__(self, None)
+        self.autorefresh = True
+        self.use_finders = False
+        self.allow_all_origins = True
+        self.max_age = settings.COLLECTION_SNAPSHOT_MAX_AGE
+        self.snapshot_prefix = ensure_leading_trailing_slash(
+            settings.COLLECTION_SNAPSHOT_URL
+        )
+        self.add_files(
+            settings.COLLECTION_SNAPSHOT_ROOT, prefix=self.snapshot_prefix
+        )
+
+    def process_request(self, request):
+        if not request.path_info.startswith(self.snapshot_prefix):
+            return None
+        return super().process_request(request)
+
+    def immutable_file_test(self, path, url):
+        filename = url[len(self.snapshot_prefix):]
+        return SNAPSHOT_VERSION_RE.match(filename) is not None
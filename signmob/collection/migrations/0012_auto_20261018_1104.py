@@ -0,0 +1,32 @@
+# Generated by Django 2.2.2 on 2026-10-18 09:04
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collection', '0011_auto_20190812_1238'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collectionevent',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='updated'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='collectiongroup',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='updated'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='collectionlocation',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='updated'),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.2 on 2026-10-18 10:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collection', '0012_auto_20261018_1104'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionTombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20, verbose_name='kind')),
+                ('object_id', models.IntegerField(verbose_name='object id')),
+                ('removed', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='removed')),
+            ],
+            options={
+                'verbose_name': 'removed map feature',
+                'verbose_name_plural': 'removed map features',
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.2 on 2026-10-18 12:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collection', '0013_collectiontombstone'),
+        ('schedule', '0011_event_calendar_not_null'),
+    ]
+
+    operations = [
+        # The event window filters on end >= now AND start <= now + days.
+        # django-scheduler only indexes (start, end), so put end first.
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS collection_occurrence_end_start '
+            'ON schedule_occurrence ("end", "start")',
+            'DROP INDEX IF EXISTS collection_occurrence_end_start',
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.2 on 2026-10-18 13:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+UPDATE_CLOSEST_GROUP_SQL = """
+UPDATE collection_collectionlocation AS location SET closest_group_id = (
+    SELECT team.id FROM collection_collectiongroup AS team
+    WHERE team.geo IS NOT NULL
+    ORDER BY team.geo <-> location.geo
+    LIMIT 1
+) WHERE location.geo IS NOT NULL;
+UPDATE collection_collectionlocation AS location
+SET closest_group_distance = ST_Distance(location.geo, team.geo)
+FROM collection_collectiongroup AS team
+WHERE team.id = location.closest_group_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collection', '0014_occurrence_end_start_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collectionlocation',
+            name='closest_group',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='closest_locations', to='collection.CollectionGroup', verbose_name='closest team'),
+        ),
+        migrations.AddField(
+            model_name='collectionlocation',
+            name='closest_group_distance',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='distance to closest team (m)'),
+        ),
+        migrations.RunSQL(UPDATE_CLOSEST_GROUP_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.2 on 2026-10-18 14:02
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collection', '0015_collectionlocation_closest_group'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionTerritory',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('geo', django.contrib.gis.db.models.fields.PolygonField(srid=4326, verbose_name='area')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='updated')),
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='territory', to='collection.CollectionGroup', verbose_name='team')),
+            ],
+            options={
+                'verbose_name': 'team territory',
+                'verbose_name_plural': 'team territories',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.2 on 2026-10-18 14:48
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collection', '0016_collectionterritory'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='collectionlocation',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='collection.CollectionLocation', verbose_name='duplicate of'),
+        ),
+        migrations.AddIndex(
+            model_name='collectionlocation',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='collection_loc_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='collectionlocation',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['address'], name='collection_loc_address_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.2 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collection', '0017_collectionlocation_duplicate_of'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='collectionlocation',
+            index=models.Index(condition=models.Q(duplicate_of=None), fields=['end', 'start'], name='collection_loc_active'),
+        ),
+    ]
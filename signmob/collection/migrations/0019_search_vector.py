@@ -0,0 +1,85 @@
+# Generated by Django 2.2.2 on 2026-10-18 16:35
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+SEARCH_TRIGGER_SQL = """
+CREATE FUNCTION {table}_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {vector};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER {table}_search_vector
+BEFORE INSERT OR UPDATE OF {columns} ON {table}
+FOR EACH ROW EXECUTE PROCEDURE {table}_search_vector();
+
+UPDATE {table} SET search_vector = {vector_columns};
+"""
+
+DROP_SEARCH_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS {table}_search_vector ON {table};
+DROP FUNCTION IF EXISTS {table}_search_vector();
+"""
+
+
+def get_search_trigger_sql(table, weighted_columns):
+    """
+    weighted_columns is a sequence of (column, weight)
+    """
+    def get_vector(prefix):
+        return ' || '.join(
+            "setweight(to_tsvector('pg_catalog.german', "
+            "coalesce({}{}, '')), '{}')".format(prefix, column, weight)
+            for column, weight in weighted_columns
+        )
+    return migrations.RunSQL(
+        SEARCH_TRIGGER_SQL.format(
+            table=table,
+            columns=', '.join(column for column, _ in weighted_columns),
+            vector=get_vector('NEW.'),
+            vector_columns=get_vector('')
+        ),
+        DROP_SEARCH_TRIGGER_SQL.format(table=table)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collection', '0018_collection_loc_active'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collectiongroup',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='collectionlocation',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='collectiongroup',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='collection_group_search'),
+        ),
+        migrations.AddIndex(
+            model_name='collectiongroup',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='collection_group_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='collectionlocation',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='collection_loc_search'),
+        ),
+        get_search_trigger_sql('collection_collectiongroup', (
+            ('name', 'A'), ('description', 'B'),
+        )),
+        get_search_trigger_sql('collection_collectionlocation', (
+            ('name', 'A'), ('address', 'B'), ('description', 'C'),
+        )),
+    ]
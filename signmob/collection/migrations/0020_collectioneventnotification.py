@@ -0,0 +1,37 @@
+# Generated by Django 2.2.2 on 2026-10-18 16:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('collection', '0019_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionEventNotification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('joined', models.BooleanField(default=True, verbose_name='joined')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='created')),
+                ('sent', models.DateTimeField(blank=True, null=True, verbose_name='sent')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='collection.CollectionEvent', verbose_name='collection event')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'event notification',
+                'verbose_name_plural': 'event notifications',
+                'ordering': ('created',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='collectioneventnotification',
+            index=models.Index(condition=models.Q(sent=None), fields=['created'], name='collection_notify_pending'),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.contrib.gis.db import models
-from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.measure import D
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connection, transaction
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.formats import date_format
@@ -36,19 +39,88 @@ class CollectionGroupMember(models.Model):
         return self.user.name
 
 
+# <-> on geography orders by distance on a sphere, the few nearest
+# candidates are ranked again by the distance on the spheroid
+CLOSEST_GROUP_SQL = """
+SELECT * FROM (
+    SELECT *, ST_Distance(geo, %s::geography) AS distance
+    FROM {group_table}
+    WHERE geo IS NOT NULL
+    ORDER BY geo <-> %s::geography
+    LIMIT 5
+) AS knn
+ORDER BY distance, id
+LIMIT 1
+"""
+
+CLOSEST_GROUPS_SQL = """
+SELECT location.id, closest.id, closest.distance
+FROM {location_table} AS location
+CROSS JOIN LATERAL (
+    SELECT * FROM (
+        SELECT id, ST_Distance(geo, location.geo) AS distance
+        FROM {group_table}
+        WHERE geo IS NOT NULL
+        ORDER BY geo <-> location.geo
+        LIMIT 5
+    ) AS knn
+    ORDER BY distance, id
+    LIMIT 1
+) AS closest
+WHERE location.geo IS NOT NULL AND location.id IN ({locations})
+"""
+
+
 class CollectionGroupManager(models.Manager):
     def get_closest(self, geo):
+        """
+        Nearest team by KNN search on the geo index,
+        distance is in meters
+        """
         if not geo:
             return None
-        groups = (
-            self.get_queryset()
-            .annotate(distance=Distance("geo", geo))
-            .order_by("distance")
+        if settings.COLLECTION_GROUP_INDEX:
+            from .group_index import get_group_index
+            return get_group_index().get_closest(geo)
+        sql = CLOSEST_GROUP_SQL.format(
+            group_table=connection.ops.quote_name(self.model._meta.db_table)
         )
+        groups = list(self.raw(sql, [geo.ewkt, geo.ewkt]))
         if groups:
             return groups[0]
         return None
 
+    def get_closest_for_locations(self, locations):
+        """
+        Nearest team for every location in the given queryset
+        with one lateral join query.
+        Returns a dict of location id to (team, distance in meters).
+        """
+        if settings.COLLECTION_GROUP_INDEX:
+            from .group_index import get_group_index
+            index = get_group_index()
+            closest = {}
+            for location in locations.exclude(geo=None).only('id', 'geo'):
+                group = index.get_closest(location.geo)
+                if group is not None:
+                    closest[location.id] = (group, group.distance)
+            return closest
+        qn = connection.ops.quote_name
+        subquery, params = locations.values('id').query.sql_with_params()
+        sql = CLOSEST_GROUPS_SQL.format(
+            location_table=qn(locations.model._meta.db_table),
+            group_table=qn(self.model._meta.db_table),
+            locations=subquery
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        groups = self.in_bulk({group_id for _, group_id, _ in rows})
+        return {
+            location_id: (groups[group_id], distance)
+            for location_id, group_id, distance in rows
+        }
+
 
 class CollectionGroup(models.Model):
     name = models.CharField(_('name'), max_length=255, blank=True)
@@ -66,12 +138,22 @@ class CollectionGroup(models.Model):
         Calendar, null=True, blank=True, on_delete=models.SET_NULL,
         verbose_name=_('calendar')
     )
+    updated = models.DateTimeField(_('updated'), auto_now=True, db_index=True)
+    # maintained by a database trigger
+    search_vector = SearchVectorField(null=True, editable=False)
 
     objects = CollectionGroupManager()
 
     class Meta:
         verbose_name = _('team')
         verbose_name_plural = _('teams')
+        indexes = [
+            GinIndex(fields=['search_vector'], name='collection_group_search'),
+            GinIndex(
+                fields=['name'], opclasses=['gin_trgm_ops'],
+                name='collection_group_name_trgm'
+            ),
+        ]
 
     def __str__(self):
         return _('Team {}').format(self.name)
@@ -89,6 +171,57 @@ class CollectionGroup(models.Model):
                 group=self, user=user).exists()
 
 
+class CollectionLocationManager(models.Manager):
+    def update_closest_group(self, queryset=None):
+        """
+        Recompute the closest team of all or the given locations,
+        returns the number of changed locations
+        """
+        if queryset is None:
+            queryset = self.get_queryset()
+        closest = CollectionGroup.objects.get_closest_for_locations(queryset)
+        changed = []
+        locations = queryset.only('id', 'closest_group', 'closest_group_distance')
+        for location in locations:
+            group, distance = closest.get(location.id, (None, None))
+            if (location.closest_group_id == (group and group.id) and
+                    location.closest_group_distance == distance):
+                continue
+            location.closest_group = group
+            location.closest_group_distance = distance
+            changed.append(location)
+        self.bulk_update(
+            changed, ['closest_group', 'closest_group_distance'],
+            batch_size=500
+        )
+        return len(changed)
+
+    def get_duplicates(self, location):
+        """
+        Places near the location with a similar name and, where both
+        have one, a similar address. Neighbouring places on one street
+        have similar addresses, so the address alone is not enough.
+        The distance check uses the geo index, similarity the trigram indexes
+        """
+        if not location.geo or not location.name:
+            return self.none()
+        similar = models.Q(name__trigram_similar=location.name)
+        if location.address:
+            similar &= (
+                models.Q(address__trigram_similar=location.address) |
+                models.Q(address='')
+            )
+        distance = D(m=settings.COLLECTION_DUPLICATE_DISTANCE)
+        return self.get_queryset().filter(
+            similar, geo__dwithin=(location.geo, distance)
+        ).exclude(id=location.id)
+
+    def find_duplicate(self, location):
+        return self.get_duplicates(location).filter(
+            duplicate_of=None
+        ).order_by('id').first()
+
+
 class CollectionLocation(models.Model):
     name = models.CharField(_('name'), max_length=255, blank=True)
     description = models.TextField(_('description'), blank=True)
@@ -113,10 +246,47 @@ class CollectionLocation(models.Model):
     needs_check = models.BooleanField(_('needs check'), default=False)
     send_material = models.BooleanField(_('send material'), default=False)
     report = models.TextField(_('report'), blank=True)
+    updated = models.DateTimeField(_('updated'), auto_now=True, db_index=True)
+
+    closest_group = models.ForeignKey(
+        CollectionGroup, null=True, blank=True, editable=False,
+        on_delete=models.SET_NULL, related_name='closest_locations',
+        verbose_name=_('closest team')
+    )
+    closest_group_distance = models.FloatField(
+        _('distance to closest team (m)'), null=True, blank=True,
+        editable=False
+    )
+    duplicate_of = models.ForeignKey(
+        'self', null=True, blank=True,
+        on_delete=models.SET_NULL, related_name='duplicates',
+        verbose_name=_('duplicate of')
+    )
+    # maintained by a database trigger
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = CollectionLocationManager()
 
     class Meta:
         verbose_name = _('collection place')
         verbose_name_plural = _('collection places')
+        indexes = [
+            # active places on the map, "end IS NULL OR end >= today"
+            # cannot be part of the index condition
+            models.Index(
+                fields=['end', 'start'], condition=models.Q(duplicate_of=None),
+                name='collection_loc_active'
+            ),
+            GinIndex(
+                fields=['name'], opclasses=['gin_trgm_ops'],
+                name='collection_loc_name_trgm'
+            ),
+            GinIndex(
+                fields=['address'], opclasses=['gin_trgm_ops'],
+                name='collection_loc_address_trgm'
+            ),
+            GinIndex(fields=['search_vector'], name='collection_loc_search'),
+        ]
 
     def __str__(self):
         return self.name
@@ -130,6 +300,18 @@ class CollectionLocation(models.Model):
     def get_domain_admin_url(self):
         return settings.SITE_URL + reverse('admin:collection_collectionlocation_change', args=(self.pk,))
 
+    def update_closest_group(self):
+        group = CollectionGroup.objects.get_closest(self.geo)
+        distance = group.distance if group is not None else None
+        if (self.closest_group_id == (group and group.id) and
+                self.closest_group_distance == distance):
+            return
+        self.closest_group = group
+        self.closest_group_distance = distance
+        CollectionLocation.objects.filter(id=self.id).update(
+            closest_group=group, closest_group_distance=distance
+        )
+
 
 class CollectionEventMember(models.Model):
     event = models.ForeignKey(
@@ -155,6 +337,46 @@ class CollectionEventMember(models.Model):
         return _('{} at {}').format(self.user, self.event)
 
 
+class CollectionEventNotificationManager(models.Manager):
+    def get_pending(self):
+        return self.get_queryset().filter(sent=None)
+
+
+class CollectionEventNotification(models.Model):
+    """
+    Outbox of event joins and cancellations, sent out as a digest
+    """
+    event = models.ForeignKey(
+        "CollectionEvent", on_delete=models.CASCADE,
+        verbose_name=_('collection event')
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        verbose_name=_('user')
+    )
+    joined = models.BooleanField(_('joined'), default=True)
+    created = models.DateTimeField(_('created'), default=timezone.now)
+    sent = models.DateTimeField(_('sent'), null=True, blank=True)
+
+    objects = CollectionEventNotificationManager()
+
+    class Meta:
+        verbose_name = _('event notification')
+        verbose_name_plural = _('event notifications')
+        ordering = ('created',)
+        indexes = [
+            models.Index(
+                fields=['created'], name='collection_notify_pending',
+                condition=models.Q(sent=None)
+            ),
+        ]
+
+    def __str__(self):
+        return '{} {} {}'.format(
+            self.user, _('joined') if self.joined else _('left'), self.event
+        )
+
+
 class CollectionEventManager(models.Manager):
     pass
 
@@ -180,6 +402,7 @@ class CollectionEvent(models.Model):
         User, through=CollectionEventMember,
         verbose_name=_('members')
     )
+    updated = models.DateTimeField(_('updated'), auto_now=True, db_index=True)
 
     objects = CollectionEventManager()
 
@@ -269,3 +492,91 @@ class CollectionResult(models.Model):
 
     def __str__(self):
         return '{} ({} - {})'.format(self.amount, self.start, self.end)
+
+
+class CollectionTombstone(models.Model):
+    """
+    Records deleted map features for delta sync of the collection API
+    """
+    kind = models.CharField(_('kind'), max_length=20)
+    object_id = models.IntegerField(_('object id'))
+    removed = models.DateTimeField(
+        _('removed'), default=timezone.now, db_index=True
+    )
+
+    class Meta:
+        verbose_name = _('removed map feature')
+        verbose_name_plural = _('removed map features')
+
+    def __str__(self):
+        return '{}_{}'.format(self.kind, self.object_id)
+
+
+TERRITORY_SQL = """
+WITH extent AS (
+    SELECT ST_Transform(ST_MakeEnvelope(%s, %s, %s, %s, 4326), 3857) AS geom
+), team AS (
+    SELECT id, ST_Transform(geo::geometry, 3857) AS geom
+    FROM {group_table} WHERE geo IS NOT NULL
+), cell AS (
+    SELECT (ST_Dump(CASE WHEN count(*) > 1 THEN ST_VoronoiPolygons(
+        ST_Collect(geom), 0, (SELECT geom FROM extent)
+    ) ELSE (SELECT geom FROM extent) END)).geom AS geom
+    FROM team
+), territory AS (
+    SELECT DISTINCT ON (team.id) team.id AS group_id,
+        ST_Intersection(cell.geom, extent.geom) AS geom
+    FROM team
+    JOIN cell ON ST_Intersects(cell.geom, team.geom)
+    CROSS JOIN extent
+    ORDER BY team.id
+)
+INSERT INTO {territory_table} (group_id, geo, updated)
+SELECT group_id, ST_Transform(geom, 4326), %s FROM territory
+WHERE GeometryType(geom) = 'POLYGON' AND NOT ST_IsEmpty(geom)
+"""
+
+
+class CollectionTerritoryManager(models.Manager):
+    @transaction.atomic
+    def rebuild(self):
+        """
+        Partition the map extent into the areas closest to each team.
+        The Voronoi diagram is computed in web mercator, so borders can
+        be off by some meters from the geodesic distances of
+        CollectionGroupManager.get_closest. Territories are only drawn
+        on the map, the closest team of a location always comes from
+        get_closest.
+        """
+        qn = connection.ops.quote_name
+        sql = TERRITORY_SQL.format(
+            group_table=qn(CollectionGroup._meta.db_table),
+            territory_table=qn(self.model._meta.db_table)
+        )
+        extent = settings.LEAFLET_CONFIG['SPATIAL_EXTENT']
+        self.get_queryset().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, list(extent) + [timezone.now()])
+            return cursor.rowcount
+
+
+class CollectionTerritory(models.Model):
+    """
+    Area of the map that is closer to the team than to any other team,
+    for display only, see CollectionTerritoryManager.rebuild
+    """
+    group = models.OneToOneField(
+        CollectionGroup, on_delete=models.CASCADE,
+        related_name='territory', verbose_name=_('team')
+    )
+    geo = models.PolygonField(_('area'))
+    updated = models.DateTimeField(_('updated'), auto_now=True)
+
+    objects = CollectionTerritoryManager()
+
+    class Meta:
+        verbose_name = _('team territory')
+        verbose_name_plural = _('team territories')
+
+    def __str__(self):
+        return str(self.group)
@@ -1,19 +1,30 @@
 from django.dispatch import receiver
 from django.db.models import signals
 from django.db import transaction
+from django.utils import timezone
 
 from .signals import (
     group_joined, location_created, location_reported,
     event_created, material_requested,
     event_joined, event_left
 )
-from .models import CollectionEvent
+from schedule.models import Occurrence
+
+from .api_views import (
+    clear_collection_feed, clear_collection_heatmap, COLLECTION_MODELS
+)
+from .group_index import bump_group_index_version
+from .models import (
+    CollectionEvent, CollectionEventNotification, CollectionGroup,
+    CollectionLocation, CollectionResult, CollectionTombstone
+)
 from .tasks import (
     location_created_task, location_reported_task,
     group_joined_task,
     event_created_task,
     material_requested_task,
-    event_joined_task, event_left_task
+    update_collection_feed_task, update_closest_groups_task,
+    update_collection_territories_task
 )
 
 
@@ -48,14 +59,131 @@ def notify_event_created(sender, event, **kwargs):
 
 @receiver(event_joined)
 def notify_event_joined(sender, event, user, **kwargs):
-    transaction.on_commit(lambda: event_joined_task.delay(event.id, user.id))
+    # coordinators get these with send_event_notification_digest_task
+    CollectionEventNotification.objects.create(
+        event=event, user=user, joined=True
+    )
 
 
 @receiver(event_left)
 def notify_event_left(sender, event, user, **kwargs):
-    transaction.on_commit(lambda: event_left_task.delay(event.id, user.id))
+    CollectionEventNotification.objects.create(
+        event=event, user=user, joined=False
+    )
 
 
 @receiver(material_requested)
 def notify_material_requested(sender, location, **kwargs):
     transaction.on_commit(lambda: material_requested_task.delay(location.id))
+
+
+@receiver(signals.post_save, sender=Occurrence)
+def touch_occurrence_events(sender, instance=None, **kwargs):
+    if kwargs.get('raw'):
+        return
+    # occurrences have their own updated_on, but the feed version
+    # only looks at collection tables
+    CollectionEvent.objects.filter(event_occurence=instance).update(
+        updated=timezone.now()
+    )
+
+
+@receiver(signals.pre_save, sender=CollectionGroup)
+@receiver(signals.pre_save, sender=CollectionLocation)
+def check_geo_changed(sender, instance=None, **kwargs):
+    if kwargs.get('raw') or instance.pk is None:
+        return
+    old_geo = sender._default_manager.filter(
+        pk=instance.pk
+    ).values_list('geo', flat=True).first()
+    instance._geo_changed = old_geo != instance.geo
+
+
+def geo_changed(instance, created=False):
+    """
+    Team or location is new or its place changed in this save
+    """
+    return created or getattr(instance, '_geo_changed', True)
+
+
+@receiver(signals.post_save, sender=CollectionLocation)
+def update_location_closest_group(sender, instance=None, created=False,
+                                  **kwargs):
+    if kwargs.get('raw'):
+        return
+    if not geo_changed(instance, created):
+        return
+    # one KNN lookup, before location tasks read the closest team
+    instance.update_closest_group()
+
+
+@receiver(signals.post_save, sender=CollectionGroup)
+@receiver(signals.post_delete, sender=CollectionGroup)
+def update_closest_groups(sender, instance=None, created=False, **kwargs):
+    if kwargs.get('raw'):
+        return
+    # post_delete has no created flag and no pre_save check
+    if not geo_changed(instance, created):
+        return
+    transaction.on_commit(lambda: update_closest_groups_task.delay())
+
+
+@receiver(signals.post_save, sender=CollectionGroup)
+@receiver(signals.post_delete, sender=CollectionGroup)
+def update_collection_territories(sender, instance=None, created=False,
+                                  **kwargs):
+    if kwargs.get('raw'):
+        return
+    if not geo_changed(instance, created):
+        return
+    transaction.on_commit(lambda: update_collection_territories_task.delay())
+
+
+@receiver(signals.post_save, sender=CollectionGroup)
+@receiver(signals.post_delete, sender=CollectionGroup)
+def invalidate_group_index(sender, **kwargs):
+    if kwargs.get('raw'):
+        return
+    transaction.on_commit(bump_group_index_version)
+
+
+def collection_feed_changed():
+    clear_collection_feed()
+    update_collection_feed_task.delay()
+
+
+@receiver(signals.post_save, sender=CollectionGroup)
+@receiver(signals.post_delete, sender=CollectionGroup)
+@receiver(signals.post_save, sender=CollectionEvent)
+@receiver(signals.post_delete, sender=CollectionEvent)
+@receiver(signals.post_save, sender=CollectionLocation)
+@receiver(signals.post_delete, sender=CollectionLocation)
+@receiver(signals.post_save, sender=Occurrence)
+@receiver(signals.post_delete, sender=Occurrence)
+def invalidate_collection_feed(sender, **kwargs):
+    if kwargs.get('raw'):
+        return
+    transaction.on_commit(collection_feed_changed)
+
+
+@receiver(signals.post_delete, sender=CollectionGroup)
+@receiver(signals.post_delete, sender=CollectionEvent)
+@receiver(signals.post_delete, sender=CollectionLocation)
+def record_collection_tombstone(sender, instance=None, **kwargs):
+    kind = next(k for k, model in COLLECTION_MODELS.items() if model is sender)
+    CollectionTombstone.objects.create(kind=kind, object_id=instance.id)
+
+
+@receiver(signals.post_save, sender=CollectionResult)
+@receiver(signals.post_delete, sender=CollectionResult)
+@receiver(signals.post_save, sender=CollectionGroup)
+@receiver(signals.post_delete, sender=CollectionGroup)
+@receiver(signals.post_save, sender=CollectionEvent)
+@receiver(signals.post_delete, sender=CollectionEvent)
+@receiver(signals.post_save, sender=CollectionLocation)
+@receiver(signals.post_delete, sender=CollectionLocation)
+def invalidate_collection_heatmap(sender, **kwargs):
+    if kwargs.get('raw'):
+        return
+    # results take their place from location, event or team
+    transaction.on_commit(clear_collection_heatmap)
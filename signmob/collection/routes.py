@@ -0,0 +1,142 @@
+"""
+Delivery route for collection places waiting for material
+"""
+import csv
+import io
+from xml.etree import ElementTree
+
+import numpy as np
+
+EARTH_RADIUS = 6371008.8
+GPX_NAMESPACE = 'http://www.topografix.com/GPX/1/1'
+ROUTE_CSV_FIELDS = (
+    'stop', 'id', 'name', 'address', 'email', 'lat', 'lng', 'distance'
+)
+
+
+def get_pending_locations(queryset):
+    return queryset.filter(
+        send_material=True, start__isnull=True, geo__isnull=False
+    ).order_by('id')
+
+
+def haversine_matrix(lngs, lats):
+    """
+    Pairwise great circle distances in meters
+    """
+    lngs = np.radians(np.asarray(lngs, dtype=float))
+    lats = np.radians(np.asarray(lats, dtype=float))
+    dlng = lngs[:, np.newaxis] - lngs[np.newaxis, :]
+    dlat = lats[:, np.newaxis] - lats[np.newaxis, :]
+    a = (
+        np.sin(dlat / 2) ** 2 +
+        np.cos(lats)[:, np.newaxis] * np.cos(lats)[np.newaxis, :] *
+        np.sin(dlng / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def nearest_neighbour_tour(dist, start=0):
+    n = len(dist)
+    visited = np.zeros(n, dtype=bool)
+    tour = np.empty(n, dtype=int)
+    current = start
+    for i in range(n):
+        tour[i] = current
+        visited[current] = True
+        if i == n - 1:
+            break
+        candidates = np.where(visited, np.inf, dist[current])
+        current = int(np.argmin(candidates))
+    return tour
+
+
+def two_opt(tour, dist, max_iterations=10000):
+    """
+    Improve a closed tour by reversing the segment with the best gain
+    until no reversal shortens it
+    """
+    tour = tour.copy()
+    n = len(tour)
+    if n < 4:
+        return tour
+    i_idx, j_idx = np.triu_indices(n, k=2)
+    # the first and the last edge share a node
+    keep = ~((i_idx == 0) & (j_idx == n - 1))
+    i_idx, j_idx = i_idx[keep], j_idx[keep]
+    for _ in range(max_iterations):
+        a, b = tour[i_idx], tour[(i_idx + 1) % n]
+        c, d = tour[j_idx], tour[(j_idx + 1) % n]
+        gain = dist[a, b] + dist[c, d] - dist[a, c] - dist[b, d]
+        best = int(np.argmax(gain))
+        if gain[best] <= 1e-7:
+            break
+        i, j = i_idx[best], j_idx[best]
+        tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1]
+    return tour
+
+
+def solve_route(dist):
+    """
+    Order of stops for a short route visiting all points once.
+    The closed tour is opened at its longest leg.
+    """
+    n = len(dist)
+    if n < 3:
+        return np.arange(n)
+    tour = two_opt(nearest_neighbour_tour(dist), dist)
+    legs = dist[tour, np.roll(tour, -1)]
+    return np.roll(tour, -(int(np.argmax(legs)) + 1))
+
+
+def get_delivery_route(locations):
+    """
+    Returns the locations in delivery order with the distance
+    in meters from the previous stop
+    """
+    locations = list(locations)
+    dist = haversine_matrix(
+        [loc.geo.x for loc in locations],
+        [loc.geo.y for loc in locations]
+    )
+    order = solve_route(dist)
+    route = []
+    for stop, index in enumerate(order):
+        distance = float(dist[order[stop - 1], index]) if stop else 0.0
+        route.append((locations[index], distance))
+    return route
+
+
+def export_route_csv(route):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(ROUTE_CSV_FIELDS)
+    for stop, (location, distance) in enumerate(route, 1):
+        writer.writerow((
+            stop, location.id, location.name, location.address,
+            location.email, location.geo.y, location.geo.x, round(distance)
+        ))
+    return output.getvalue()
+
+
+def export_route_gpx(route, name='Materialversand'):
+    ElementTree.register_namespace('', GPX_NAMESPACE)
+    gpx = ElementTree.Element('{%s}gpx' % GPX_NAMESPACE, {
+        'version': '1.1', 'creator': 'signmob'
+    })
+    rte = ElementTree.SubElement(gpx, '{%s}rte' % GPX_NAMESPACE)
+    ElementTree.SubElement(rte, '{%s}name' % GPX_NAMESPACE).text = name
+    for location, _ in route:
+        rtept = ElementTree.SubElement(rte, '{%s}rtept' % GPX_NAMESPACE, {
+            'lat': str(location.geo.y), 'lon': str(location.geo.x)
+        })
+        ElementTree.SubElement(
+            rtept, '{%s}name' % GPX_NAMESPACE
+        ).text = location.name
+        if location.address:
+            ElementTree.SubElement(
+                rtept, '{%s}desc' % GPX_NAMESPACE
+            ).text = location.address
+    return '<?xml version="1.0" encoding="UTF-8"?>\n' + ElementTree.tostring(
+        gpx, encoding='unicode'
+    )
@@ -0,0 +1,39 @@
+"""
+Full text and fuzzy search over teams and collection places
+
+Matches the German search vector (kept up to date by a trigger)
+or a trigram similar name/address, both backed by GIN indexes.
+"""
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, TrigramSimilarity
+)
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+
+from .models import CollectionGroup, CollectionLocation
+
+SEARCH_CONFIG = 'german'
+SEARCH_TRIGRAM_FIELDS = {
+    CollectionGroup: ('name',),
+    CollectionLocation: ('name', 'address'),
+}
+
+
+def get_search_filter(model, query):
+    search_filter = Q(search_vector=SearchQuery(query, config=SEARCH_CONFIG))
+    for field in SEARCH_TRIGRAM_FIELDS[model]:
+        search_filter |= Q(**{'{}__trigram_similar'.format(field): query})
+    return search_filter
+
+
+def get_search_score(model, query):
+    rank = SearchRank(
+        F('search_vector'), SearchQuery(query, config=SEARCH_CONFIG)
+    )
+    similarities = [
+        TrigramSimilarity(field, query)
+        for field in SEARCH_TRIGRAM_FIELDS[model]
+    ]
+    if len(similarities) > 1:
+        return rank + Greatest(*similarities)
+    return rank + similarities[0]
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+from django.conf import settings
+
+from whitenoise.compress import Compressor
+
+from .api_views import get_collection_feed
+
+SNAPSHOT_NAME = 'collection'
+SNAPSHOT_KEEP_VERSIONS = 3
+SNAPSHOT_VERSION_RE = re.compile(
+    r'^%s\.([0-9a-f]{12})\.json(\.gz|\.br)?$' % SNAPSHOT_NAME
+)
+COMPRESSED_SUFFIXES = ('.br', '.gz')
+
+
+def get_versioned_name(feed):
+    digest = hashlib.md5(feed).hexdigest()[:12]
+    return '{}.{}.json'.format(SNAPSHOT_NAME, digest)
+
+
+def link_file(src, dst):
+    """
+    Atomically point dst to the same file as src,
+    remove dst if there is no src
+    """
+    if not os.path.exists(src):
+        if os.path.exists(dst):
+            os.remove(dst)
+        return
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return
+    tmp_dst = dst + '.tmp'
+    if os.path.exists(tmp_dst):
+        os.remove(tmp_dst)
+    os.link(src, tmp_dst)
+    os.replace(tmp_dst, dst)
+
+
+def write_versioned_files(root, name, feed):
+    """
+    Write feed and its compressed variants in a temporary directory
+    and move them into root, the uncompressed file last
+    """
+    tmp_dir = tempfile.mkdtemp(dir=root)
+    try:
+        tmp_path = os.path.join(tmp_dir, name)
+        with open(tmp_path, 'wb') as f:
+            f.write(feed)
+        for compressed in Compressor(quiet=True).compress(tmp_path):
+            pass
+        for suffix in COMPRESSED_SUFFIXES + ('',):
+            if os.path.exists(tmp_path + suffix):
+                os.chmod(tmp_path + suffix, 0o644)
+                os.replace(tmp_path + suffix, os.path.join(root, name + suffix))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def remove_old_versions(root, current_name):
+    versions = {}
+    for filename in os.listdir(root):
+        match = SNAPSHOT_VERSION_RE.match(filename)
+        if match is None:
+            continue
+        path = os.path.join(root, filename)
+        versions.setdefault(match.group(1), []).append(path)
+
+    def get_mtime(paths):
+        return max(os.path.getmtime(p) for p in paths)
+
+    current = SNAPSHOT_VERSION_RE.match(current_name).group(1)
+    old = sorted(
+        (v for v in versions if v != current),
+        key=lambda v: get_mtime(versions[v]), reverse=True
+    )
+    for version in old[SNAPSHOT_KEEP_VERSIONS - 1:]:
+        for path in versions[version]:
+            os.remove(path)
+
+
+def write_collection_snapshot(root=None):
+    """
+    Write the full collection feed to <root>/collection.<hash>.json
+    with .gz and .br variants and link <root>/collection.json to it.
+    Returns the versioned file name.
+    """
+    if root is None:
+        root = settings.COLLECTION_SNAPSHOT_ROOT
+    os.makedirs(root, exist_ok=True)
+
+    _, feed = get_collection_feed()
+    name = get_versioned_name(feed)
+    path = os.path.join(root, name)
+    if not os.path.exists(path):
+        write_versioned_files(root, name, feed)
+
+    stable_path = os.path.join(root, SNAPSHOT_NAME + '.json')
+    for suffix in COMPRESSED_SUFFIXES + ('',):
+        link_file(path + suffix, stable_path + suffix)
+
+    remove_old_versions(root, name)
+    return name
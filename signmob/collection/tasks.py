@@ -1,27 +1,38 @@
 from datetime import timedelta
 
+from django.conf import settings
+from django.db import transaction
 from django.utils import formats
 from django.utils import timezone
 
 from config.celery_app import app as celery_app
 
 from signmob.users.models import User
-from signmob.users.utils import send_template_email
+from signmob.users.utils import (
+    render_template_emails, send_mail_messages, send_template_email,
+    send_template_emails
+)
 
 from .models import (
-    CollectionEvent, CollectionGroup, CollectionGroupMember, CollectionLocation
+    CollectionEvent, CollectionEventNotification, CollectionGroup,
+    CollectionGroupMember, CollectionLocation, CollectionTerritory,
+    CollectionTombstone
 )
+from .api_views import update_collection_feed
 from .slack import send_message
+from .snapshot import write_collection_snapshot
 
 
 @celery_app.task
 def location_created_task(location_id):
     try:
-        location = CollectionLocation.objects.get(id=location_id)
+        location = CollectionLocation.objects.select_related(
+            'closest_group'
+        ).get(id=location_id)
     except CollectionLocation.DoesNotExist:
         return
 
-    group = CollectionGroup.objects.get_closest(location.geo)
+    group = location.closest_group
 
     message = 'Yeah ein neuer Sammelort wurde angelegt: "<{url}|{name}">!'.format(
         name=location.name, url=location.get_domain_admin_url()
@@ -31,6 +42,7 @@ def location_created_task(location_id):
             team=group.name
         )
     send_message(message, group=group)
+    notify_nearby_users(location, 'created')
 
 
 @celery_app.task
@@ -42,16 +54,15 @@ def material_requested_task(location_id):
 
     users = User.objects.filter(groups__name='Material')
 
-    for user in users:
-        send_template_email(
-            user=user,
-            subject='Material angefordert',
-            template='collection/emails/material_requested.txt',
-            context={
-                'user': user,
-                'location': location
-            }
-        )
+    send_template_emails({
+        'user': user,
+        'subject': 'Material angefordert',
+        'template': 'collection/emails/material_requested.txt',
+        'context': {
+            'user': user,
+            'location': location
+        }
+    } for user in users)
 
 
 @celery_app.task
@@ -77,11 +88,13 @@ def material_sent_task(location_id):
 @celery_app.task
 def location_reported_task(location_id):
     try:
-        location = CollectionLocation.objects.get(id=location_id)
+        location = CollectionLocation.objects.select_related(
+            'closest_group'
+        ).get(id=location_id)
     except CollectionLocation.DoesNotExist:
         return
 
-    group = CollectionGroup.objects.get_closest(location.geo)
+    group = location.closest_group
 
     message = 'Oh oh, Problem beim Sammelort "<{url}|{name}"> gemeldet.'.format(
         name=location.name, url=location.get_domain_admin_url()
@@ -91,6 +104,54 @@ def location_reported_task(location_id):
             team=group.name
         )
     send_message(message, group=group)
+    notify_nearby_users(location, 'reported')
+
+
+NEARBY_LOCATION_MAILS = {
+    'created': (
+        'Neuer Sammelort in Deiner Nähe',
+        'collection/emails/location_nearby_created.txt'
+    ),
+    'reported': (
+        'Problem bei einem Sammelort in Deiner Nähe',
+        'collection/emails/location_nearby_reported.txt'
+    ),
+}
+
+
+def notify_nearby_users(location, kind):
+    radius = settings.COLLECTION_NEARBY_RADIUS
+    if not location.geo or not radius:
+        return
+    users = User.objects.get_nearby(location.geo, radius)
+    if location.user_id is not None:
+        users = users.exclude(id=location.user_id)
+    user_ids = []
+    for user_id in users.values_list('id', flat=True).iterator():
+        user_ids.append(user_id)
+        if len(user_ids) == settings.COLLECTION_NEARBY_CHUNK_SIZE:
+            nearby_location_task.delay(location.id, kind, user_ids)
+            user_ids = []
+    if user_ids:
+        nearby_location_task.delay(location.id, kind, user_ids)
+
+
+@celery_app.task
+def nearby_location_task(location_id, kind, user_ids):
+    try:
+        location = CollectionLocation.objects.get(id=location_id)
+    except CollectionLocation.DoesNotExist:
+        return
+
+    subject, template = NEARBY_LOCATION_MAILS[kind]
+    send_mail_messages(render_template_emails(
+        User.objects.filter(id__in=user_ids),
+        subject=subject,
+        template=template,
+        context={
+            'location': location
+        }
+    ))
 
 
 @celery_app.task
@@ -201,31 +262,28 @@ def announce_event_tomorrow(event):
             url=event.get_domain_url()
         ))
 
-    for member in event.collectioneventmember_set.all():
-        send_template_email(
-            user=member.user,
-            subject='Morgen sammeln für den Volksentscheid Transparenz',
-            template='collection/emails/event_tomorrow.txt',
-            context={
-                'user': member.user,
-                'event': event
-            }
-        )
+    emails = render_template_emails(
+        [member.user for member in
+         event.collectioneventmember_set.select_related('user')],
+        subject='Morgen sammeln für den Volksentscheid Transparenz',
+        template='collection/emails/event_tomorrow.txt',
+        context={
+            'event': event
+        }
+    )
 
     if event.group:
-        users = event.get_non_attendees()
+        emails.extend(render_template_emails(
+            event.get_non_attendees(),
+            subject='Spontan Zeit für den Volksentscheid Transparenz?',
+            template='collection/emails/event_tomorrow_missing.txt',
+            context={
+                'event': event,
+                'team': event.group
+            }
+        ))
 
-        for user in users:
-            send_template_email(
-                user=user,
-                subject='Spontan Zeit für den Volksentscheid Transparenz?',
-                template='collection/emails/event_tomorrow_missing.txt',
-                context={
-                    'user': user,
-                    'event': event,
-                    'team': event.group
-                }
-            )
+    send_mail_messages(emails)
 
 
 def send_event_ended(event):
@@ -256,60 +314,125 @@ def send_event_ended(event):
         )
 
 
+# event_joined_task and event_left_task are only left for messages queued
+# before the digest, remove them in the next release
 @celery_app.task
 def event_joined_task(event_id, user_id):
-    event_membership_notification(event_id, user_id, joined=True)
+    queue_event_notification(event_id, user_id, joined=True)
 
 
 @celery_app.task
 def event_left_task(event_id, user_id):
-    event_membership_notification(event_id, user_id, joined=False)
+    queue_event_notification(event_id, user_id, joined=False)
 
 
-def event_membership_notification(event_id, user_id, joined=True):
-    try:
-        event = CollectionEvent.objects.get(id=event_id)
-    except CollectionGroup.DoesNotExist:
+def queue_event_notification(event_id, user_id, joined=True):
+    if not CollectionEvent.objects.filter(id=event_id).exists():
         return
-    try:
-        event_user = User.objects.get(id=user_id)
-    except User.DoesNotExist:
+    if not User.objects.filter(id=user_id).exists():
         return
+    CollectionEventNotification.objects.create(
+        event_id=event_id, user_id=user_id, joined=joined
+    )
+
+
+@celery_app.task
+def send_event_notification_digest_task():
+    send_event_notification_digest()
+
+
+def get_event_notification_changes(notifications):
+    """
+    Latest change per event and participant, in order of the events.
+    Changes that cancel out (joined and left again or the other way
+    round) are dropped.
+    """
+    first, last = {}, {}
+    for notification in notifications:
+        key = (notification.event_id, notification.user_id)
+        first.setdefault(key, notification)
+        last[key] = notification
+    changes = [
+        notification for key, notification in last.items()
+        if notification.joined == first[key].joined
+    ]
+    return sorted(changes, key=lambda n: (n.event_id, n.created))
+
+
+@transaction.atomic
+def send_event_notification_digest():
+    """
+    Send one mail per coordinator with all event joins and
+    cancellations since the last digest
+    """
+    notifications = list(
+        CollectionEventNotification.objects.get_pending().select_related(
+            'event', 'event__event_occurence', 'user'
+        ).select_for_update(skip_locked=True, of=('self',))
+    )
+    if not notifications:
+        return 0
+    changes = get_event_notification_changes(notifications)
 
     notify_users = User.objects.filter(
         groups__name='Teilnahmebenachrichtigungen'
     )
-
+    messages = []
     for user in notify_users:
-        if user == event_user:
+        user_changes = [n for n in changes if n.user_id != user.id]
+        if not user_changes:
             continue
-        if joined:
-            notify_event_joined(user, event, event_user)
-        else:
-            notify_event_left(user, event, event_user)
+        messages.append({
+            'user': user,
+            'subject': 'Neue Terminteilnahmen und Absagen ({})'.format(
+                len(user_changes)
+            ),
+            'template': 'collection/emails/event_notification_digest.txt',
+            'context': {
+                'user': user,
+                'joined': [n for n in user_changes if n.joined],
+                'left': [n for n in user_changes if not n.joined],
+            }
+        })
+    send_template_emails(messages)
 
+    now = timezone.now()
+    CollectionEventNotification.objects.filter(
+        id__in=[n.id for n in notifications]
+    ).update(sent=now)
+    CollectionEventNotification.objects.filter(
+        sent__lt=now - timedelta(days=settings.COLLECTION_NOTIFICATION_KEEP_DAYS)
+    ).delete()
+    return len(messages)
 
-def notify_event_joined(user, event, event_user):
-    send_template_email(
-        user=user,
-        subject='Neue Terminteilnahme bei {}'.format(event),
-        template='collection/emails/event_joined.txt',
-        context={
-            'user': user,
-            'event_user': event_user,
-            'event': event
-        }
-    )
 
+@celery_app.task
+def update_collection_feed_task():
+    update_collection_feed()
+    if settings.COLLECTION_SNAPSHOT_ROOT:
+        write_collection_snapshot()
 
-def notify_event_left(user, event, event_user):
-    send_template_email(
-        user=user,
-        subject='Absage bei Termin {}'.format(event),
-        template='collection/emails/event_left.txt',
-        context={
-            'user': user,
-            'event_user': event_user,
-            'event': event
-        }
-    )
+
+@celery_app.task
+def update_closest_groups_task():
+    CollectionLocation.objects.update_closest_group()
+
+
+@celery_app.task
+def update_collection_territories_task():
+    CollectionTerritory.objects.rebuild()
+
+
+@celery_app.task
+def write_collection_snapshot_task():
+    if settings.COLLECTION_SNAPSHOT_ROOT:
+        write_collection_snapshot()
+
+
+@celery_app.task
+def purge_collection_tombstones():
+    CollectionTombstone.objects.filter(
+        removed__lt=timezone.now() - timedelta(
+            seconds=settings.COLLECTION_SYNC_MAX_AGE
+        )
+    ).delete()
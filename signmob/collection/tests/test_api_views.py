@@ -0,0 +1,267 @@
+import json
+from datetime import timedelta
+
+import pytest
+from django.contrib.gis.geos import Point
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from schedule.models import Calendar, Event, Occurrence
+
+from signmob.collection.api_views import clear_collection_feed
+from signmob.collection.models import (
+    CollectionEvent, CollectionGroup, CollectionLocation, CollectionResult,
+    CollectionTerritory
+)
+
+pytestmark = pytest.mark.django_db
+
+
+def get_json(response):
+    if response.streaming:
+        return json.loads(b"".join(response.streaming_content))
+    return json.loads(response.content)
+
+
+@pytest.fixture(autouse=True)
+def empty_feed_cache():
+    clear_collection_feed()
+
+
+def test_collection_feed_served_from_cache(client):
+    group = CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+
+    response = client.get("/api/collection/")
+    assert response.status_code == 200
+    data = json.loads(response.content)
+    assert data["type"] == "FeatureCollection"
+    assert [f["id"] for f in data["features"]] == ["group_{}".format(group.id)]
+
+    with CaptureQueriesContext(connection) as queries:
+        cached = client.get("/api/collection/")
+    assert cached.content == response.content
+    assert not any("collection_" in q["sql"] for q in queries.captured_queries)
+
+
+def test_collection_feed_cleared(client):
+    client.get("/api/collection/")
+    CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+    clear_collection_feed()
+
+    data = json.loads(client.get("/api/collection/").content)
+    assert len(data["features"]) == 1
+
+
+def test_collection_filter_bbox_kind(client):
+    CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+    CollectionGroup.objects.create(name="Potsdam", geo=Point(13.06, 52.4))
+
+    data = get_json(
+        client.get("/api/collection/?bbox=13.3,52.45,13.5,52.55&kind=group")
+    )
+    assert [f["properties"]["name"] for f in data["features"]] == ["Mitte"]
+
+    data = get_json(client.get("/api/collection/?kind=location"))
+    assert data["features"] == []
+
+
+def test_collection_filter_invalid(client):
+    assert client.get("/api/collection/?bbox=1,2,3").status_code == 400
+    assert client.get("/api/collection/?kind=foo").status_code == 400
+
+
+def test_collection_tile(client):
+    CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+
+    # zoom 10 tile containing Berlin Mitte
+    response = client.get("/api/collection/tiles/10/550/335.mvt")
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/vnd.mapbox-vector-tile"
+    assert b"Mitte" in response.content
+
+    response = client.get("/api/collection/tiles/10/0/0.mvt")
+    assert response.content == b""
+
+    assert client.get("/api/collection/tiles/1/2/0.mvt").status_code == 404
+
+
+def test_collection_clusters(client):
+    CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+    CollectionGroup.objects.create(name="Mitte 2", geo=Point(13.4001, 52.5001))
+    CollectionGroup.objects.create(name="Potsdam", geo=Point(13.06, 52.4))
+
+    data = json.loads(client.get("/api/collection/?zoom=10").content)
+    clusters = data["features"]
+    assert [c["properties"]["kind"] for c in clusters] == ["cluster", "cluster"]
+    assert clusters[0]["properties"]["details"]["count"] == 2
+    assert clusters[0]["properties"]["details"]["kinds"]["group"] == 2
+
+    data = json.loads(client.get("/api/collection/?zoom=16").content)
+    assert len(data["features"]) == 3
+
+
+def test_collection_filter_streamed(client, settings):
+    CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+
+    response = client.get("/api/collection/?kind=group")
+    assert response.streaming
+    streamed = get_json(response)
+
+    settings.COLLECTION_FEED_FAST_SERIALIZER = False
+    response = client.get("/api/collection/?kind=group")
+    assert not response.streaming
+    assert get_json(response) == streamed
+
+
+def test_collection_conditional_get(client):
+    group = CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+
+    response = client.get("/api/collection/")
+    etag = response["ETag"]
+    assert response["Last-Modified"]
+
+    response = client.get("/api/collection/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+    response = client.get("/api/collection/?kind=group", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+
+    group.delete()
+    clear_collection_feed()
+    response = client.get("/api/collection/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
+def test_collection_delta_sync(client):
+    mitte = CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+    CollectionGroup.objects.create(name="Potsdam", geo=Point(13.06, 52.4))
+
+    response = client.get("/api/collection/")
+    version = response["X-Sync-Version"]
+
+    data = get_json(client.get("/api/collection/?since={}".format(version)))
+    # changes within the safety margin are sent again
+    assert len(data["features"]) == 2
+    assert data["removed"] == []
+
+    mitte_id = mitte.id
+    mitte.delete()
+    wedding = CollectionGroup.objects.create(name="Wedding", geo=Point(13.36, 52.55))
+    data = get_json(client.get("/api/collection/?since={}".format(version)))
+    assert "group_{}".format(wedding.id) in [f["id"] for f in data["features"]]
+    assert data["removed"] == ["group_{}".format(mitte_id)]
+    assert float(data["version"]) >= float(version)
+
+    assert client.get("/api/collection/?since=abc").status_code == 400
+
+
+def test_collection_event_window(client):
+    start = timezone.now() + timedelta(days=30)
+    end = start + timedelta(hours=2)
+    calendar = Calendar.objects.create(name="Sammeln", slug="sammeln")
+    event = Event.objects.create(
+        title="Sammeln", start=start, end=end, calendar=calendar
+    )
+    occurrence = Occurrence.objects.create(
+        event=event, title="Sammeln", start=start, end=end,
+        original_start=start, original_end=end
+    )
+    CollectionEvent.objects.create(
+        name="Sammeln", geo=Point(13.4, 52.5), event_occurence=occurrence
+    )
+
+    data = get_json(client.get("/api/collection/?kind=event"))
+    assert data["features"] == []
+
+    data = get_json(client.get("/api/collection/?kind=event&days=31"))
+    assert [f["properties"]["name"] for f in data["features"]] == ["Sammeln"]
+
+    assert client.get("/api/collection/?days=0").status_code == 400
+    assert client.get("/api/collection/?days=1000").status_code == 400
+
+
+def test_collection_territories(client):
+    CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+    CollectionGroup.objects.create(name="Potsdam", geo=Point(13.06, 52.4))
+    CollectionTerritory.objects.rebuild()
+
+    data = get_json(client.get("/api/collection/territories/"))
+    assert data["type"] == "FeatureCollection"
+    assert sorted(f["properties"]["name"] for f in data["features"]) == [
+        "Mitte", "Potsdam"
+    ]
+    assert data["features"][0]["geometry"]["type"] == "Polygon"
+
+
+def test_collection_heatmap(client, admin_client):
+    mitte = CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+    rathaus = CollectionLocation.objects.create(
+        name="Rathaus", geo=Point(13.4, 52.5)
+    )
+    potsdam = CollectionGroup.objects.create(
+        name="Potsdam", geo=Point(13.06, 52.4)
+    )
+    start = timezone.now() - timedelta(days=1)
+    CollectionResult.objects.create(amount=10, group=mitte, start=start)
+    CollectionResult.objects.create(
+        amount=5, group=mitte, location=rathaus, start=start
+    )
+    CollectionResult.objects.create(
+        amount=7, group=potsdam, start=start - timedelta(days=30)
+    )
+
+    assert client.get("/api/collection/heatmap/").status_code == 403
+
+    data = get_json(admin_client.get("/api/collection/heatmap/?size=5000"))
+    assert sorted(
+        f["properties"]["amount"] for f in data["features"]
+    ) == [7, 15]
+    assert data["features"][0]["geometry"]["type"] == "Polygon"
+
+    since = (start - timedelta(days=1)).date().isoformat()
+    data = get_json(
+        admin_client.get("/api/collection/heatmap/?size=250&start=" + since)
+    )
+    assert [f["properties"]["amount"] for f in data["features"]] == [15]
+    assert data["features"][0]["properties"]["count"] == 2
+
+    # the grid does not move with the filtered results
+    all_data = get_json(admin_client.get("/api/collection/heatmap/?size=250"))
+    assert data["features"][0]["geometry"] in [
+        f["geometry"] for f in all_data["features"]
+    ]
+
+    response = admin_client.get("/api/collection/heatmap/?size=123")
+    assert response.status_code == 400
+
+
+def test_collection_search(client):
+    CollectionGroup.objects.create(
+        name="Kreuzberg", description="Wir sammeln am Wochenende",
+        geo=Point(13.4, 52.49)
+    )
+    today = timezone.now().date()
+    CollectionLocation.objects.create(
+        name="Buchhandlung am Kiez", address="Bergmannstraße 12",
+        description="Listen liegen an der Kasse", geo=Point(13.39, 52.49),
+        start=today
+    )
+    CollectionLocation.objects.create(
+        name="Buchladen", address="Oranienstraße 3", geo=Point(13.42, 52.5)
+    )
+
+    data = get_json(client.get("/api/collection/search/?q=Buchhandlungen"))
+    assert [f["properties"]["name"] for f in data["features"]] == [
+        "Buchhandlung am Kiez"
+    ]
+
+    data = get_json(client.get("/api/collection/search/?q=Kreutzberg"))
+    assert [f["properties"]["kind"] for f in data["features"]] == ["group"]
+
+    data = get_json(client.get("/api/collection/search/?q=Bergmannstr"))
+    assert [f["properties"]["name"] for f in data["features"]] == [
+        "Buchhandlung am Kiez"
+    ]
+
+    assert client.get("/api/collection/search/?q=").status_code == 400
@@ -0,0 +1,67 @@
+import pytest
+
+from signmob.collection.models import CollectionEvent
+from signmob.users.models import User
+from signmob.users.utils import render_template_email, render_template_emails
+
+RECIPIENT_COUNT = 1000
+TEMPLATE = 'collection/emails/event_tomorrow.txt'
+
+
+def get_users(count):
+    users = [
+        User(
+            id=i, name='Sammlerin {}'.format(i),
+            email='user{}@example.org'.format(i)
+        ) for i in range(1, count + 1)
+    ]
+    # rendered in full
+    users[1].name = 'Tom & Jerry'
+    users[2].name = ''
+    return users
+
+
+def render_each(users, event):
+    return [
+        render_template_email(
+            user=user, subject='Morgen', template=TEMPLATE,
+            context={'user': user, 'event': event}
+        ) for user in users
+    ]
+
+
+def render_once(users, event):
+    return render_template_emails(
+        users, subject='Morgen', template=TEMPLATE,
+        context={'event': event}
+    )
+
+
+def test_render_once_matches_render_each():
+    event = CollectionEvent(id=1, name='Mauerpark')
+    users = get_users(5)
+
+    each = render_each(users, event)
+    once = render_once(users, event)
+
+    assert [m.body for m in once] == [m.body for m in each]
+    assert [m.to for m in once] == [m.to for m in each]
+    assert 'Tom & Jerry' in once[1].body
+
+
+@pytest.mark.benchmark
+def test_render_once_email_benchmark(timed):
+    event = CollectionEvent(id=1, name='Mauerpark')
+    users = get_users(RECIPIENT_COUNT)
+
+    each, each_time = timed(render_each, users, event)
+    once, once_time = timed(render_once, users, event)
+    print(
+        "\n{} recipients: render per user {:.3f}s, render once {:.3f}s "
+        "({:.1f}x)".format(
+            RECIPIENT_COUNT, each_time, once_time, each_time / once_time
+        )
+    )
+
+    assert [m.body for m in once] == [m.body for m in each]
+    assert each_time / once_time > 2
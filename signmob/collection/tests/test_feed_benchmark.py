@@ -0,0 +1,94 @@
+import json
+import random
+from datetime import timedelta
+
+import pytest
+from django.contrib.gis.geos import Point
+from django.utils import timezone
+from schedule.models import Calendar, Event, Occurrence
+
+from signmob.collection.api_views import (
+    render_collection_feed_drf, render_collection_feed_fast
+)
+from signmob.collection.models import (
+    CollectionEvent, CollectionGroup, CollectionLocation
+)
+
+pytestmark = pytest.mark.django_db
+
+FEATURE_COUNT = 10000
+
+
+def test_fast_feed_serializer_matches_drf():
+    today = timezone.now().date() - timedelta(days=1)
+    group = CollectionGroup.objects.create(
+        name="Schöneberg Süd", description="Treffen im „Café Größenwahn“",
+        geo=Point(13.35, 52.48)
+    )
+    CollectionGroup.objects.create(name="Ohne Ort")
+    start = timezone.now() + timedelta(days=2)
+    end = start + timedelta(hours=2)
+    calendar = Calendar.objects.create(name="Sammeln", slug="sammeln")
+    event = Event.objects.create(
+        title="Sammeln", start=start, end=end, calendar=calendar
+    )
+    occurrence = Occurrence.objects.create(
+        event=event, title="Sammeln", start=start, end=end,
+        original_start=start, original_end=end
+    )
+    CollectionEvent.objects.create(
+        name="Straßenfest Köpenick", description="Stand an der Brücke – ab 10 Uhr",
+        geo=Point(13.57, 52.44), group=group, event_occurence=occurrence
+    )
+    CollectionLocation.objects.create(
+        name="Späti „Zur Ecke“", description="Öffnungszeiten: Mo–Fr",
+        address="Hauptstraße 1\n10827 Berlin", geo=Point(13.35, 52.49),
+        start=today
+    )
+    CollectionLocation.objects.create(
+        name="Bäckerei Müller", address="Grünberger Straße 3",
+        geo=Point(13.45, 52.51), start=today, end=today + timedelta(days=5)
+    )
+
+    now = timezone.now()
+    fast_feed = render_collection_feed_fast(now)
+    assert fast_feed == render_collection_feed_drf(now)
+    names = {
+        feature['properties']['name']
+        for feature in json.loads(fast_feed)['features']
+    }
+    assert {
+        "Schöneberg Süd", "Straßenfest Köpenick", "Späti „Zur Ecke“",
+        "Bäckerei Müller"
+    } <= names
+
+
+@pytest.mark.benchmark
+def test_fast_feed_serializer_benchmark(timed):
+    rnd = random.Random(42)
+    today = timezone.now().date() - timedelta(days=1)
+    CollectionLocation.objects.bulk_create(
+        CollectionLocation(
+            name="Späti Nr. {}".format(i),
+            description="Öffnungszeiten: Mo–Fr",
+            address="Hauptstraße {}\n10827 Berlin".format(i),
+            geo=Point(
+                round(rnd.uniform(13.1, 13.7), 6),
+                round(rnd.uniform(52.35, 52.65), 6)
+            ),
+            start=today,
+        )
+        for i in range(FEATURE_COUNT)
+    )
+
+    now = timezone.now()
+    drf_feed, drf_time = timed(render_collection_feed_drf, now)
+    fast_feed, fast_time = timed(render_collection_feed_fast, now)
+    print(
+        "\n{} features: DRF serializer {:.3f}s, fast serializer {:.3f}s "
+        "({:.1f}x)".format(
+            FEATURE_COUNT, drf_time, fast_time, drf_time / fast_time
+        )
+    )
+
+    assert fast_feed == drf_feed
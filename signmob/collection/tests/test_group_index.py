@@ -0,0 +1,99 @@
+import random
+
+import pytest
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import Point
+from django.db import connection
+
+from signmob.collection.group_index import (
+    bump_group_index_version, geodesic_distance, get_group_index
+)
+from signmob.collection.models import CollectionGroup, CollectionLocation
+
+pytestmark = pytest.mark.django_db
+
+
+def get_postgis_distance(a, b):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT ST_Distance(%s::geography, %s::geography)',
+            [a.ewkt, b.ewkt]
+        )
+        return cursor.fetchone()[0]
+
+
+def test_geodesic_distance():
+    pairs = [
+        (Point(13.4, 52.5), Point(13.06, 52.4)),
+        (Point(13.4, 52.5), Point(13.4001, 52.5001)),
+        (Point(13.4, 52.5), Point(11.6, 48.1)),
+        (Point(0, 0), Point(10, 0)),
+    ]
+    for a, b in pairs:
+        distance = geodesic_distance(a.x, a.y, b.x, b.y)
+        assert distance == pytest.approx(get_postgis_distance(a, b), abs=1e-3)
+
+
+def test_group_index_matches_database(settings):
+    settings.COLLECTION_GROUP_INDEX = False
+    rand = random.Random(42)
+    for i in range(50):
+        CollectionGroup.objects.create(
+            name=str(i),
+            geo=Point(rand.uniform(12.9, 13.8), rand.uniform(52.3, 52.7))
+        )
+    bump_group_index_version()
+    index = get_group_index()
+
+    for _ in range(100):
+        geo = Point(rand.uniform(12.9, 13.8), rand.uniform(52.3, 52.7))
+        group = index.get_closest(geo)
+        expected = CollectionGroup.objects.annotate(
+            distance=Distance('geo', geo)
+        ).order_by('distance', 'id').first()
+        assert group == expected
+        assert group.distance == pytest.approx(expected.distance.m, abs=1e-3)
+        assert CollectionGroup.objects.get_closest(geo) == expected
+
+
+def test_group_index_invalidation(settings):
+    settings.COLLECTION_GROUP_INDEX = True
+    CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+    bump_group_index_version()
+    index = get_group_index()
+    assert get_group_index() is index
+
+    potsdam = CollectionGroup.objects.create(
+        name="Potsdam", geo=Point(13.06, 52.4)
+    )
+    # stale until the version changes
+    assert CollectionGroup.objects.get_closest(Point(13.1, 52.39)).name == "Mitte"
+    bump_group_index_version()
+    assert CollectionGroup.objects.get_closest(Point(13.1, 52.39)) == potsdam
+    assert get_group_index() is not index
+
+
+def test_locations_use_group_index(settings):
+    settings.COLLECTION_GROUP_INDEX = True
+    mitte = CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+    bump_group_index_version()
+    location = CollectionLocation.objects.create(
+        name="Babelsberg", geo=Point(13.1, 52.39)
+    )
+    CollectionLocation.objects.create(name="Ohne Ort")
+    # not in the index until the version changes
+    CollectionGroup.objects.create(name="Potsdam", geo=Point(13.06, 52.4))
+
+    closest = CollectionGroup.objects.get_closest_for_locations(
+        CollectionLocation.objects.all()
+    )
+    assert list(closest) == [location.id]
+    group, distance = closest[location.id]
+    assert group == mitte
+    assert distance == pytest.approx(
+        get_postgis_distance(location.geo, mitte.geo), abs=1e-3
+    )
+
+    location.refresh_from_db()
+    assert location.closest_group == mitte
+    assert CollectionLocation.objects.update_closest_group() == 0
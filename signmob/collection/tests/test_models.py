@@ -0,0 +1,146 @@
+import pytest
+from django.contrib.gis.geos import Point
+
+from signmob.collection.models import (
+    CollectionGroup, CollectionLocation, CollectionTerritory
+)
+
+pytestmark = pytest.mark.django_db
+
+
+def test_get_closest():
+    assert CollectionGroup.objects.get_closest(Point(13.4, 52.5)) is None
+
+    CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+    CollectionGroup.objects.create(name="Potsdam", geo=Point(13.06, 52.4))
+    CollectionGroup.objects.create(name="Ohne Ort")
+
+    group = CollectionGroup.objects.get_closest(Point(13.1, 52.4))
+    assert group.name == "Potsdam"
+    assert 2000 < group.distance < 3000
+    assert CollectionGroup.objects.get_closest(None) is None
+
+
+def test_get_closest_for_locations():
+    mitte = CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+    potsdam = CollectionGroup.objects.create(
+        name="Potsdam", geo=Point(13.06, 52.4)
+    )
+    alex = CollectionLocation.objects.create(
+        name="Alex", geo=Point(13.41, 52.52)
+    )
+    babelsberg = CollectionLocation.objects.create(
+        name="Babelsberg", geo=Point(13.1, 52.39)
+    )
+    CollectionLocation.objects.create(name="Ohne Ort")
+
+    closest = CollectionGroup.objects.get_closest_for_locations(
+        CollectionLocation.objects.all()
+    )
+    assert {
+        location_id: group for location_id, (group, _) in closest.items()
+    } == {alex.id: mitte, babelsberg.id: potsdam}
+    assert closest[alex.id][1] < 3000
+
+
+def test_update_closest_group():
+    mitte = CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+    location = CollectionLocation.objects.create(
+        name="Babelsberg", geo=Point(13.1, 52.39)
+    )
+    location.refresh_from_db()
+    assert location.closest_group == mitte
+
+    potsdam = CollectionGroup.objects.create(
+        name="Potsdam", geo=Point(13.06, 52.4)
+    )
+    assert CollectionLocation.objects.update_closest_group() == 1
+    assert CollectionLocation.objects.update_closest_group() == 0
+    location.refresh_from_db()
+    assert location.closest_group == potsdam
+    assert location.closest_group_distance < 5000
+
+
+def test_closest_group_only_on_move():
+    mitte = CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+    location = CollectionLocation.objects.create(
+        name="Babelsberg", geo=Point(13.1, 52.39)
+    )
+    potsdam = CollectionGroup.objects.create(
+        name="Potsdam", geo=Point(13.06, 52.4)
+    )
+
+    location.refresh_from_db()
+    location.name = "Bahnhof Babelsberg"
+    location.save()
+    location.refresh_from_db()
+    assert location.closest_group == mitte
+
+    location.geo = Point(13.07, 52.4)
+    location.save()
+    location.refresh_from_db()
+    assert location.closest_group == potsdam
+
+
+def test_territories():
+    mitte = CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+    potsdam = CollectionGroup.objects.create(
+        name="Potsdam", geo=Point(13.06, 52.4)
+    )
+    CollectionGroup.objects.create(name="Ohne Ort")
+
+    assert CollectionTerritory.objects.rebuild() == 2
+    assert CollectionTerritory.objects.rebuild() == 2
+
+    def get_territory_group(geo):
+        territory = CollectionTerritory.objects.filter(
+            geo__intersects=geo
+        ).first()
+        return territory and territory.group
+
+    assert get_territory_group(Point(13.41, 52.52)) == mitte
+    assert get_territory_group(Point(13.1, 52.39)) == potsdam
+    # outside of the map extent
+    assert get_territory_group(Point(11.6, 48.1)) is None
+
+
+def test_single_territory():
+    mitte = CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+
+    assert CollectionTerritory.objects.rebuild() == 1
+    territory = CollectionTerritory.objects.get()
+    assert territory.group == mitte
+    assert territory.geo.intersects(Point(13.1, 52.39))
+
+
+def test_find_duplicate():
+    original = CollectionLocation.objects.create(
+        name="Bäckerei Müller", address="Hauptstraße 5, 10827 Berlin",
+        geo=Point(13.35, 52.49)
+    )
+    CollectionLocation.objects.create(
+        name="Späti", address="Hauptstraße 7, 10827 Berlin",
+        geo=Point(13.3502, 52.4901)
+    )
+
+    location = CollectionLocation(
+        name="Bäckerei Mueller", address="Hauptstraße 5",
+        geo=Point(13.3501, 52.4901)
+    )
+    assert CollectionLocation.objects.find_duplicate(location) == original
+
+    location.geo = Point(13.4, 52.5)
+    assert CollectionLocation.objects.find_duplicate(location) is None
+
+
+def test_find_duplicate_neighbour():
+    CollectionLocation.objects.create(
+        name="Bäckerei Müller", address="Hauptstraße 5, 10827 Berlin",
+        geo=Point(13.35, 52.49)
+    )
+    # similar address next door is a different place
+    location = CollectionLocation(
+        name="Späti", address="Hauptstraße 7, 10827 Berlin",
+        geo=Point(13.3502, 52.4901)
+    )
+    assert CollectionLocation.objects.find_duplicate(location) is None
@@ -0,0 +1,79 @@
+import pytest
+from django.contrib.gis.geos import Point
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from signmob.collection.api_views import (
+    get_active_filters, get_fast_feed_sql, parse_bbox
+)
+from signmob.collection.models import CollectionGroup, CollectionLocation
+from signmob.users.models import User
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def no_seqscan():
+    # test tables are tiny, make the planner use an index if it can
+    with connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+
+
+def explain(sql, params=None):
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN ' + sql, params)
+        return '\n'.join(row[0] for row in cursor.fetchall())
+
+
+def explain_last_query(func, *args):
+    with CaptureQueriesContext(connection) as context:
+        func(*args)
+    return explain(context.captured_queries[-1]['sql'])
+
+
+def test_get_closest_plan():
+    plan = explain_last_query(
+        CollectionGroup.objects.get_closest, Point(13.4, 52.5)
+    )
+    assert 'Seq Scan' not in plan
+    assert 'collection_collectiongroup_geo_id' in plan
+
+
+def test_get_closest_for_locations_plan():
+    plan = explain_last_query(
+        CollectionGroup.objects.get_closest_for_locations,
+        CollectionLocation.objects.filter(id__in=[1, 2, 3])
+    )
+    assert 'Seq Scan' not in plan
+    assert 'collection_collectiongroup_geo_id' in plan
+
+
+def test_collection_feed_bbox_plan():
+    bbox = parse_bbox('13.3,52.45,13.5,52.55')
+    sql, params = get_fast_feed_sql(timezone.now(), bbox=bbox)
+    plan = explain(sql, params)
+    assert 'Seq Scan' not in plan
+    assert 'collection_collectiongroup_geo_id' in plan
+
+
+def test_active_locations_plan():
+    active = get_active_filters(timezone.now())['location']
+    plan = CollectionLocation.objects.filter(active).explain()
+    assert 'Seq Scan' not in plan
+    assert 'collection_loc_active' in plan
+
+
+def test_duplicate_locations_plan():
+    location = CollectionLocation(
+        name="Bäckerei Müller", address="Hauptstraße 5",
+        geo=Point(13.35, 52.49)
+    )
+    plan = CollectionLocation.objects.get_duplicates(location).explain()
+    assert 'Seq Scan' not in plan
+
+
+def test_nearby_users_plan():
+    plan = User.objects.get_nearby(Point(13.4, 52.5), 1500).explain()
+    assert 'Seq Scan' not in plan
+    assert 'users_user_geo_id' in plan
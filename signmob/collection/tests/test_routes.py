@@ -0,0 +1,69 @@
+import time
+
+import numpy as np
+import pytest
+from django.contrib.gis.geos import Point
+
+from signmob.collection.models import CollectionLocation
+from signmob.collection.routes import (
+    export_route_csv, export_route_gpx, get_delivery_route,
+    get_pending_locations, haversine_matrix, nearest_neighbour_tour,
+    solve_route, two_opt
+)
+
+
+def get_tour_length(tour, dist):
+    return dist[tour, np.roll(tour, -1)].sum()
+
+
+def test_haversine_matrix():
+    dist = haversine_matrix([13.4, 13.06], [52.5, 52.4])
+    assert dist[0, 0] == 0
+    assert dist[0, 1] == dist[1, 0]
+    assert dist[0, 1] == pytest.approx(25000, rel=0.05)
+
+
+def test_two_opt_uncrosses_tour():
+    # corners of a square, nearest neighbour from 0 takes the diagonal
+    dist = haversine_matrix([0, 0.011, 0.01, 0], [0, 0, 0.01, 0.01])
+    tour = np.array([0, 2, 1, 3])
+    improved = two_opt(tour, dist)
+    assert sorted(improved) == [0, 1, 2, 3]
+    assert get_tour_length(improved, dist) < get_tour_length(tour, dist)
+
+
+def test_solve_route_is_fast():
+    rand = np.random.RandomState(42)
+    lngs = rand.uniform(12.9, 13.8, 300)
+    lats = rand.uniform(52.3, 52.7, 300)
+
+    start = time.perf_counter()
+    dist = haversine_matrix(lngs, lats)
+    order = solve_route(dist)
+    assert time.perf_counter() - start < 1
+
+    assert sorted(order) == list(range(300))
+    nearest = nearest_neighbour_tour(dist)
+    assert get_tour_length(order, dist) <= get_tour_length(nearest, dist)
+
+
+@pytest.mark.django_db
+def test_delivery_route_export():
+    for name, geo in (("A", (13.3, 52.5)), ("C", (13.5, 52.5)),
+                      ("B", (13.4, 52.5))):
+        CollectionLocation.objects.create(
+            name=name, geo=Point(*geo), send_material=True
+        )
+    CollectionLocation.objects.create(name="Versandt", geo=Point(13.4, 52.5))
+
+    locations = get_pending_locations(CollectionLocation.objects.all())
+    route = get_delivery_route(locations)
+    names = [location.name for location, _ in route]
+    assert names in (["A", "B", "C"], ["C", "B", "A"])
+    assert route[0][1] == 0
+
+    csv = export_route_csv(route)
+    assert csv.splitlines()[0] == 'stop,id,name,address,email,lat,lng,distance'
+    assert len(csv.splitlines()) == 4
+    gpx = export_route_gpx(route)
+    assert gpx.count('<rtept') == 3
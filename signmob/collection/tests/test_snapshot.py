@@ -0,0 +1,38 @@
+import gzip
+import os
+
+import pytest
+from django.contrib.gis.geos import Point
+
+from signmob.collection.api_views import clear_collection_feed, get_collection_feed
+from signmob.collection.models import CollectionGroup
+from signmob.collection.snapshot import write_collection_snapshot
+
+pytestmark = pytest.mark.django_db
+
+
+def test_write_collection_snapshot(tmpdir):
+    clear_collection_feed()
+    CollectionGroup.objects.create(name="Mitte", geo=Point(13.4, 52.5))
+    root = tmpdir.strpath
+
+    name = write_collection_snapshot(root)
+    _, feed = get_collection_feed()
+    with open(os.path.join(root, name), "rb") as f:
+        assert f.read() == feed
+    with open(os.path.join(root, "collection.json"), "rb") as f:
+        assert f.read() == feed
+    if os.path.exists(os.path.join(root, name + ".gz")):
+        with gzip.open(os.path.join(root, "collection.json.gz")) as f:
+            assert f.read() == feed
+
+    assert write_collection_snapshot(root) == name
+
+    CollectionGroup.objects.create(name="Wedding", geo=Point(13.36, 52.55))
+    clear_collection_feed()
+    new_name = write_collection_snapshot(root)
+    assert new_name != name
+    assert os.path.exists(os.path.join(root, name))
+    assert os.path.samefile(
+        os.path.join(root, new_name), os.path.join(root, "collection.json")
+    )
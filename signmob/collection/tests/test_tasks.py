@@ -0,0 +1,82 @@
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth.models import Group
+from django.core import mail
+from django.utils import timezone
+
+from signmob.collection.models import (
+    CollectionEvent, CollectionEventMember, CollectionEventNotification,
+    CollectionTombstone
+)
+from signmob.collection.signals import event_joined, event_left
+from signmob.collection.tasks import (
+    event_joined_task, event_left_task, purge_collection_tombstones,
+    send_event_notification_digest
+)
+from signmob.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def test_event_notification_digest():
+    coordinators = Group.objects.create(name='Teilnahmebenachrichtigungen')
+    coordinator = UserFactory()
+    coordinator.groups.add(coordinators)
+    participant = UserFactory()
+    coordinators.user_set.add(participant)
+    event = CollectionEvent.objects.create(name='Alex')
+    other_event = CollectionEvent.objects.create(name='Mauerpark')
+    cancelled_event = CollectionEvent.objects.create(name='Tempelhof')
+
+    for signal, joined_event in (
+            (event_left, event), (event_joined, other_event),
+            (event_joined, cancelled_event), (event_left, cancelled_event)):
+        signal.send(
+            sender=CollectionEventMember, event=joined_event, user=participant
+        )
+    assert CollectionEventNotification.objects.get_pending().count() == 4
+
+    # participants are not told about their own changes
+    assert send_event_notification_digest() == 1
+    assert len(mail.outbox) == 1
+    assert mail.outbox[0].to == [coordinator.email]
+    assert mail.outbox[0].subject.endswith('(2)')
+    body = mail.outbox[0].body
+    assert body.index('Mauerpark') < body.index('Absagen') < body.index('Alex')
+    # joined and left again within one digest
+    assert 'Tempelhof' not in body
+
+    assert CollectionEventNotification.objects.get_pending().count() == 0
+    assert send_event_notification_digest() == 0
+    assert len(mail.outbox) == 1
+
+
+def test_queued_event_membership_tasks():
+    event = CollectionEvent.objects.create(name='Alex')
+    participant = UserFactory()
+
+    event_joined_task(event.id, participant.id)
+    event_left_task(event.id, participant.id)
+    # event deleted before the task ran
+    event_joined_task(event.id + 1, participant.id)
+
+    assert [
+        n.joined for n in
+        CollectionEventNotification.objects.get_pending().order_by('created')
+    ] == [True, False]
+
+
+def test_purge_collection_tombstones(settings):
+    now = timezone.now()
+    max_age = timedelta(seconds=settings.COLLECTION_SYNC_MAX_AGE)
+    CollectionTombstone.objects.create(
+        kind='location', object_id=1, removed=now - max_age - timedelta(hours=1)
+    )
+    recent = CollectionTombstone.objects.create(
+        kind='location', object_id=2, removed=now - max_age + timedelta(hours=1)
+    )
+
+    purge_collection_tombstones()
+
+    assert list(CollectionTombstone.objects.all()) == [recent]
@@ -20,6 +20,7 @@ from .forms import (
     CollectionLocationReportForm,
     CollectionEventJoinForm
 )
+from .api_views import get_active_filters
 from .signals import event_left
 from .utils import get_period
 
@@ -42,6 +43,9 @@ class CollectionGroupDetailView(DetailView):
             group=self.object,
             event_occurence__end__gte=now
         ).order_by('event_occurence__start')
+        context['locations'] = self.object.closest_locations.filter(
+            get_active_filters(now)['location']
+        ).order_by('closest_group_distance')
 
         user = self.request.user
         if user.is_authenticated:
@@ -1,3 +1,6 @@
+import os
+import time
+
 import pytest
 from django.conf import settings
 from django.test import RequestFactory
@@ -5,6 +8,15 @@ from django.test import RequestFactory
 from signmob.users.tests.factories import UserFactory
 
 
+def pytest_collection_modifyitems(config, items):
+    if os.environ.get("BENCHMARK"):
+        return
+    skip = pytest.mark.skip(reason="set BENCHMARK=1 to run benchmarks")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
 @pytest.fixture(autouse=True)
 def media_storage(settings, tmpdir):
     settings.MEDIA_ROOT = tmpdir.strpath
@@ -18,3 +30,12 @@ def user() -> settings.AUTH_USER_MODEL:
 @pytest.fixture
 def request_factory() -> RequestFactory:
     return RequestFactory()
+
+
+@pytest.fixture
+def timed():
+    def timed(func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        return result, time.perf_counter() - start
+    return timed
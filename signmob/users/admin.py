@@ -1,9 +1,12 @@
 from django.contrib import admin
 from django.contrib.auth import admin as auth_admin
 from django.contrib.auth import get_user_model
+from django.db.models import Count, Q, Sum
+from django.utils.translation import ugettext_lazy as _
 
 from signmob.admin_utils import SendMailMixin
 from signmob.users.forms import UserChangeForm, UserCreationForm
+from signmob.users.models import BulkMailChunk, BulkMailJob
 
 User = get_user_model()
 
@@ -41,3 +44,59 @@ class UserAdmin(SendMailMixin, auth_admin.UserAdmin):
     ]
 
     actions = ['send_mail']
+
+
+class BulkMailChunkInline(admin.TabularInline):
+    model = BulkMailChunk
+    fields = (
+        'index', 'user_count', 'sent_count', 'started', 'updated', 'finished'
+    )
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def user_count(self, obj):
+        return len(obj.user_ids)
+    user_count.short_description = _('recipients')
+
+
+@admin.register(BulkMailJob)
+class BulkMailJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'subject', 'created', 'created_by', 'user_count',
+        'progress', 'sent', 'finished'
+    )
+    list_filter = ('created', 'finished')
+    list_select_related = ('created_by',)
+    search_fields = ('subject',)
+    date_hierarchy = 'created'
+    readonly_fields = (
+        'subject', 'body', 'created', 'created_by', 'user_count',
+        'progress', 'sent', 'finished'
+    )
+    inlines = [BulkMailChunkInline]
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return qs.annotate(
+            chunk_count=Count('chunks'),
+            finished_chunk_count=Count(
+                'chunks', filter=Q(chunks__finished__isnull=False)
+            ),
+            sent_count=Sum('chunks__sent_count'),
+        )
+
+    def has_add_permission(self, request):
+        return False
+
+    def progress(self, obj):
+        return '{} / {}'.format(obj.finished_chunk_count, obj.chunk_count)
+    progress.short_description = _('chunks done')
+
+    def sent(self, obj):
+        return obj.sent_count or 0
+    sent.short_description = _('sent')
+    sent.admin_order_field = 'sent_count'
@@ -0,0 +1,169 @@
+"""
+Asyncio SMTP email backend for large mailings
+
+Messages are sent over a few persistent connections at once instead of
+one synchronous round trip after the other. Between open() and close()
+the connections are kept for the following send_messages calls.
+
+Batches from celery tasks (users.utils.send_mail_messages, bulk mail
+chunks) use it directly with
+DJANGO_BULK_EMAIL_BACKEND=signmob.users.mail_backends.AsyncSMTPEmailBackend.
+Behind the celery email backend it gets one message per call, then it
+only saves the reconnects like the stock SMTP backend.
+"""
+import asyncio
+import logging
+
+import aiosmtplib
+
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.message import sanitize_address
+
+logger = logging.getLogger(__name__)
+
+
+def is_transient(exc):
+    """
+    4xx replies and lost connections are worth another try
+    """
+    if isinstance(exc, aiosmtplib.SMTPRecipientsRefused):
+        return all(400 <= r.code < 500 for r in exc.recipients)
+    if isinstance(exc, aiosmtplib.SMTPResponseException):
+        return 400 <= exc.code < 500
+    return isinstance(exc, (
+        aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError,
+        aiosmtplib.SMTPTimeoutError
+    ))
+
+
+class AsyncSMTPEmailBackend(BaseEmailBackend):
+    def __init__(self, host=None, port=None, username=None, password=None,
+                 use_tls=None, use_ssl=None, timeout=None,
+                 concurrency=None, retries=None, retry_delay=None,
+                 fail_silently=False, **kwargs):
+        super().__init__(fail_silently=fail_silently)
+        self.host = host or settings.EMAIL_HOST
+        self.port = port or settings.EMAIL_PORT
+        self.username = settings.EMAIL_HOST_USER if username is None else username
+        self.password = settings.EMAIL_HOST_PASSWORD if password is None else password
+        self.use_tls = settings.EMAIL_USE_TLS if use_tls is None else use_tls
+        self.use_ssl = settings.EMAIL_USE_SSL if use_ssl is None else use_ssl
+        self.timeout = settings.EMAIL_TIMEOUT if timeout is None else timeout
+        self.concurrency = concurrency or settings.EMAIL_ASYNC_CONCURRENCY
+        self.retries = settings.EMAIL_ASYNC_RETRIES if retries is None else retries
+        self.retry_delay = (
+            settings.EMAIL_ASYNC_RETRY_DELAY if retry_delay is None
+            else retry_delay
+        )
+        self.loop = None
+        self.clients = []
+
+    def open(self):
+        if self.loop is not None:
+            return False
+        self.loop = asyncio.new_event_loop()
+        # connections are made on first use
+        self.clients = [None] * self.concurrency
+        return True
+
+    def close(self):
+        if self.loop is None:
+            return
+        try:
+            self.loop.run_until_complete(self.disconnect_all())
+        finally:
+            self.loop.close()
+            self.loop = None
+            self.clients = []
+
+    def send_messages(self, email_messages):
+        messages = [m for m in email_messages if m.recipients()]
+        if not messages:
+            return 0
+        new_conn_created = self.open()
+        try:
+            return self.loop.run_until_complete(self.send_all(messages))
+        finally:
+            if new_conn_created:
+                self.close()
+
+    async def send_all(self, messages):
+        queue = asyncio.Queue()
+        for message in messages:
+            queue.put_nowait(message)
+        workers = min(self.concurrency, len(messages))
+        # let the other connections finish before raising
+        results = await asyncio.gather(*(
+            self.worker(queue, slot) for slot in range(workers)
+        ), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return sum(results)
+
+    async def connect(self):
+        client = aiosmtplib.SMTP(
+            hostname=self.host, port=self.port,
+            use_tls=self.use_ssl, timeout=self.timeout
+        )
+        await client.connect()
+        if self.use_tls:
+            await client.starttls()
+        if self.username and self.password:
+            await client.login(self.username, self.password)
+        return client
+
+    async def disconnect_all(self):
+        await asyncio.gather(*(
+            self.disconnect(client) for client in self.clients
+            if client is not None
+        ))
+
+    async def disconnect(self, client):
+        if not client.is_connected:
+            return
+        try:
+            await client.quit()
+        except aiosmtplib.SMTPException:
+            client.close()
+
+    async def worker(self, queue, slot):
+        """
+        Send queued messages over the connection in slot until
+        the queue is empty
+        """
+        sent = 0
+        while not queue.empty():
+            message = queue.get_nowait()
+            for attempt in range(self.retries + 1):
+                try:
+                    client = self.clients[slot]
+                    if client is None or not client.is_connected:
+                        client = self.clients[slot] = await self.connect()
+                    await self.send(client, message)
+                    sent += 1
+                    break
+                except aiosmtplib.SMTPException as exc:
+                    if isinstance(exc, aiosmtplib.SMTPServerDisconnected):
+                        self.clients[slot] = None
+                    if is_transient(exc) and attempt < self.retries:
+                        logger.info('Retrying mail to %s: %s',
+                                    message.recipients(), exc)
+                        await asyncio.sleep(self.retry_delay * 2 ** attempt)
+                        continue
+                    if not self.fail_silently:
+                        raise
+                    break
+        return sent
+
+    async def send(self, client, message):
+        encoding = message.encoding or settings.DEFAULT_CHARSET
+        from_email = sanitize_address(message.from_email, encoding)
+        recipients = [
+            sanitize_address(addr, encoding) for addr in message.recipients()
+        ]
+        await client.sendmail(
+            from_email, recipients,
+            message.message().as_bytes(linesep='\r\n')
+        )
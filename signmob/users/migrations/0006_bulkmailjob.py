@@ -0,0 +1,54 @@
+# Generated by Django 2.2.2 on 2026-10-18 17:20
+
+from django.conf import settings
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_geo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulkMailJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255, verbose_name='subject')),
+                ('body', models.TextField(verbose_name='body')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='created')),
+                ('user_count', models.PositiveIntegerField(default=0, verbose_name='recipients')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='finished')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='created by')),
+            ],
+            options={
+                'verbose_name': 'bulk mail',
+                'verbose_name_plural': 'bulk mails',
+                'ordering': ('-created',),
+            },
+        ),
+        migrations.CreateModel(
+            name='BulkMailChunk',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField(verbose_name='index')),
+                ('user_ids', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), size=None, verbose_name='users')),
+                ('last_user_id', models.IntegerField(default=0, verbose_name='last user id')),
+                ('sent_count', models.PositiveIntegerField(default=0, verbose_name='sent')),
+                ('started', models.DateTimeField(blank=True, null=True, verbose_name='started')),
+                ('updated', models.DateTimeField(blank=True, null=True, verbose_name='updated')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='finished')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='users.BulkMailJob', verbose_name='bulk mail')),
+            ],
+            options={
+                'verbose_name': 'bulk mail chunk',
+                'verbose_name_plural': 'bulk mail chunks',
+                'ordering': ('job', 'index'),
+                'unique_together': {('job', 'index')},
+            },
+        ),
+    ]
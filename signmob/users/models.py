@@ -1,8 +1,11 @@
 import hashlib
 import hmac
 
-from django.db import models
+from datetime import timedelta
+
+from django.db import models, transaction
 from django.contrib.gis.db import models as geo_models
+from django.contrib.gis.measure import D
 from django.contrib.auth.models import (
     AbstractBaseUser,
     PermissionsMixin,
@@ -11,6 +14,7 @@ from django.contrib.auth.models import (
 from django.urls import reverse
 from django.conf import settings
 from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.contrib.postgres.fields import ArrayField
 from django.utils.translation import ugettext_lazy as _
 from django.utils import timezone
 from django.utils.crypto import constant_time_compare
@@ -54,6 +58,16 @@ class UserManager(BaseUserManager):
         user.save(using=self._db)
         return user
 
+    def get_nearby(self, geo, distance):
+        """
+        Active users whose Kiez is within distance meters of geo,
+        ST_DWithin uses the spatial index on geo
+        """
+        return self.get_queryset().filter(
+            is_active=True, email__isnull=False,
+            geo__dwithin=(geo, D(m=distance))
+        ).exclude(email='')
+
 
 class User(AbstractBaseUser, PermissionsMixin):
     username_validator = UnicodeUsernameValidator()
@@ -136,3 +150,98 @@ class User(AbstractBaseUser, PermissionsMixin):
     def send_mail(self, subject, body, **kwargs):
         from .utils import send_mail_user
         return send_mail_user(subject, body, self, **kwargs)
+
+
+class BulkMailJobManager(models.Manager):
+    def create_job(self, user_ids, subject, body, created_by=None):
+        user_ids = sorted(set(user_ids))
+        size = settings.BULK_MAIL_CHUNK_SIZE
+        with transaction.atomic():
+            job = self.create(
+                subject=subject, body=body, created_by=created_by,
+                user_count=len(user_ids)
+            )
+            BulkMailChunk.objects.bulk_create([
+                BulkMailChunk(
+                    job=job, index=index,
+                    user_ids=user_ids[pos:pos + size]
+                ) for index, pos in enumerate(range(0, len(user_ids), size))
+            ])
+        return job
+
+    def get_unfinished(self):
+        return self.get_queryset().filter(finished=None)
+
+
+class BulkMailJob(models.Model):
+    subject = models.CharField(_('subject'), max_length=255)
+    body = models.TextField(_('body'))
+    created = models.DateTimeField(_('created'), default=timezone.now)
+    created_by = models.ForeignKey(
+        'User', null=True, blank=True, on_delete=models.SET_NULL,
+        related_name='+', verbose_name=_('created by')
+    )
+    user_count = models.PositiveIntegerField(_('recipients'), default=0)
+    finished = models.DateTimeField(_('finished'), null=True, blank=True)
+
+    objects = BulkMailJobManager()
+
+    class Meta:
+        verbose_name = _('bulk mail')
+        verbose_name_plural = _('bulk mails')
+        ordering = ('-created',)
+
+    def __str__(self):
+        return self.subject
+
+    def update_finished(self):
+        """
+        Mark the job as finished once no chunk is left to send,
+        which includes jobs without any recipients
+        """
+        unfinished = BulkMailChunk.objects.filter(
+            finished=None
+        ).values('job_id')
+        BulkMailJob.objects.filter(id=self.id, finished=None).exclude(
+            id__in=unfinished
+        ).update(finished=timezone.now())
+
+
+class BulkMailChunkManager(models.Manager):
+    def claim(self, chunk_id):
+        """
+        Mark the chunk as started unless it is finished or another
+        worker is still on it. Progress of a crashed or timed out
+        worker is taken over after the task time limit.
+        """
+        now = timezone.now()
+        stale = now - timedelta(seconds=settings.CELERY_TASK_TIME_LIMIT)
+        return self.get_queryset().filter(id=chunk_id, finished=None).filter(
+            models.Q(started=None) | models.Q(updated__lt=stale)
+        ).update(started=now, updated=now) == 1
+
+
+class BulkMailChunk(models.Model):
+    job = models.ForeignKey(
+        BulkMailJob, on_delete=models.CASCADE,
+        related_name='chunks', verbose_name=_('bulk mail')
+    )
+    index = models.PositiveIntegerField(_('index'))
+    user_ids = ArrayField(models.IntegerField(), verbose_name=_('users'))
+    # users are sent to in order of their id
+    last_user_id = models.IntegerField(_('last user id'), default=0)
+    sent_count = models.PositiveIntegerField(_('sent'), default=0)
+    started = models.DateTimeField(_('started'), null=True, blank=True)
+    updated = models.DateTimeField(_('updated'), null=True, blank=True)
+    finished = models.DateTimeField(_('finished'), null=True, blank=True)
+
+    objects = BulkMailChunkManager()
+
+    class Meta:
+        verbose_name = _('bulk mail chunk')
+        verbose_name_plural = _('bulk mail chunks')
+        ordering = ('job', 'index')
+        unique_together = ('job', 'index')
+
+    def __str__(self):
+        return '{} #{}'.format(self.job, self.index)
@@ -1,8 +1,15 @@
+from celery import group
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
 
 from config import celery_app
 
-from .utils import send_simple_template_mail
+from .models import BulkMailChunk, BulkMailJob
+from .utils import (
+    get_bulk_mail_connection, render_simple_template_mail, send_mail_messages
+)
 
 User = get_user_model()
 
@@ -11,13 +18,70 @@ def chunker(seq, size):
     return (seq[pos:pos + size] for pos in range(0, len(seq), size))
 
 
+def send_bulk_mail(user_ids, subject, body, created_by=None):
+    """
+    Record a bulk mail job and queue its chunks after the
+    current transaction
+    """
+    job = BulkMailJob.objects.create_job(
+        user_ids, subject, body, created_by=created_by
+    )
+    transaction.on_commit(lambda: send_bulk_mail_job.delay(job.id))
+    return job
+
+
+@celery_app.task
+def send_bulk_mail_job(job_id):
+    chunk_ids = list(BulkMailChunk.objects.filter(
+        job_id=job_id, finished=None
+    ).values_list('id', flat=True))
+    if not chunk_ids:
+        # no recipients, otherwise resume_bulk_mail_jobs queues it forever
+        BulkMailJob(id=job_id).update_finished()
+        return
+    group(
+        send_bulk_mail_chunk.si(chunk_id) for chunk_id in chunk_ids
+    ).apply_async()
+
+
 @celery_app.task
-def send_bulk_mail(user_ids, subject, body):
-    chunks = chunker(user_ids, 200)
-    for chunk in chunks:
-        users = User.objects.filter(id__in=chunk)
-        for user in users:
-            send_simple_template_mail(
-                user, subject, body,
-                priority=False
+def send_bulk_mail_chunk(chunk_id):
+    if not BulkMailChunk.objects.claim(chunk_id):
+        return
+    chunk = BulkMailChunk.objects.select_related('job').get(id=chunk_id)
+    job = chunk.job
+    users = list(User.objects.filter(
+        id__in=chunk.user_ids, id__gt=chunk.last_user_id
+    ).order_by('id'))
+
+    # save progress after every batch, a resumed chunk resends
+    # at most one batch
+    with get_bulk_mail_connection() as connection:
+        for batch in chunker(users, settings.CELERY_EMAIL_CHUNK_SIZE):
+            emails = [
+                email for email in (
+                    render_simple_template_mail(user, job.subject, job.body)
+                    for user in batch
+                ) if email is not None
+            ]
+            send_mail_messages(emails, connection=connection)
+            chunk.last_user_id = batch[-1].id
+            chunk.sent_count += len(emails)
+            chunk.updated = timezone.now()
+            chunk.save(
+                update_fields=['last_user_id', 'sent_count', 'updated']
             )
+
+    chunk.finished = timezone.now()
+    chunk.save(update_fields=['finished'])
+    job.update_finished()
+
+
+@celery_app.task
+def resume_bulk_mail_jobs():
+    """
+    Queue the remaining chunks of jobs that did not finish,
+    chunks still being worked on are skipped
+    """
+    for job_id in BulkMailJob.objects.get_unfinished().values_list('id', flat=True):
+        send_bulk_mail_job.delay(job_id)
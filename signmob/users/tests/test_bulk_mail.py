@@ -0,0 +1,77 @@
+import pytest
+from django.core import mail
+
+from signmob.users.models import BulkMailChunk, BulkMailJob
+from signmob.users.tasks import (
+    resume_bulk_mail_jobs, send_bulk_mail_chunk, send_bulk_mail_job
+)
+from signmob.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def bulk_mail_settings(settings):
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    settings.BULK_MAIL_CHUNK_SIZE = 2
+    settings.CELERY_EMAIL_CHUNK_SIZE = 1
+    return settings
+
+
+def test_send_bulk_mail_job(bulk_mail_settings):
+    users = UserFactory.create_batch(5)
+    job = BulkMailJob.objects.create_job(
+        [u.id for u in users], 'Hallo {name}', 'Hier: {url}'
+    )
+    assert job.chunks.count() == 3
+
+    send_bulk_mail_job(job.id)
+
+    assert len(mail.outbox) == 5
+    assert {m.subject for m in mail.outbox} == {
+        'Hallo {}'.format(u.name) for u in users
+    }
+    job.refresh_from_db()
+    assert job.finished is not None
+    assert sum(c.sent_count for c in job.chunks.all()) == 5
+
+
+def test_bulk_mail_job_without_recipients(bulk_mail_settings):
+    job = BulkMailJob.objects.create_job([], 'Hallo', 'Hi')
+    assert job.chunks.count() == 0
+
+    resume_bulk_mail_jobs()
+
+    job.refresh_from_db()
+    assert job.finished is not None
+    assert not BulkMailJob.objects.get_unfinished().exists()
+    assert len(mail.outbox) == 0
+
+
+def test_send_bulk_mail_chunk_resumes(bulk_mail_settings):
+    users = UserFactory.create_batch(2)
+    job = BulkMailJob.objects.create_job([u.id for u in users], 'Hallo', 'Hi')
+    chunk = job.chunks.get()
+    # a previous run sent to the first user before it crashed
+    BulkMailChunk.objects.filter(id=chunk.id).update(
+        last_user_id=min(chunk.user_ids), sent_count=1
+    )
+
+    send_bulk_mail_chunk(chunk.id)
+    assert [m.to for m in mail.outbox] == [[users[1].email]]
+
+    # finished chunks are not sent again
+    send_bulk_mail_chunk(chunk.id)
+    assert len(mail.outbox) == 1
+    chunk.refresh_from_db()
+    assert chunk.sent_count == 2
+
+
+def test_bulk_mail_chunk_claim(bulk_mail_settings):
+    user = UserFactory()
+    job = BulkMailJob.objects.create_job([user.id], 'Hallo', 'Hi')
+    chunk = job.chunks.get()
+
+    assert BulkMailChunk.objects.claim(chunk.id)
+    # another worker is still on it
+    assert not BulkMailChunk.objects.claim(chunk.id)
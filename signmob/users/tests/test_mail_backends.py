@@ -0,0 +1,116 @@
+import socket
+
+import aiosmtplib
+import pytest
+from aiosmtpd.controller import Controller
+from django.core.mail import EmailMessage
+from djcelery_email.tasks import send_emails
+from djcelery_email.utils import email_to_dict
+
+from signmob.users.mail_backends import AsyncSMTPEmailBackend
+from signmob.users.utils import send_mail_messages
+
+ASYNC_BACKEND = 'signmob.users.mail_backends.AsyncSMTPEmailBackend'
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.failures = 0
+        self.reply = '451 Try again later'
+        self.envelopes = []
+        self.peers = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.peers.add(session.peer)
+        if self.failures:
+            self.failures -= 1
+            return self.reply
+        self.envelopes.append(envelope)
+        return '250 OK'
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_handler(settings):
+    handler = RecordingHandler()
+    controller = Controller(
+        handler, hostname='127.0.0.1', port=get_free_port()
+    )
+    controller.start()
+    settings.EMAIL_HOST = '127.0.0.1'
+    settings.EMAIL_PORT = controller.port
+    settings.EMAIL_HOST_USER = ''
+    settings.EMAIL_USE_TLS = False
+    settings.EMAIL_USE_SSL = False
+    settings.EMAIL_ASYNC_CONCURRENCY = 3
+    settings.EMAIL_ASYNC_RETRY_DELAY = 0
+    yield handler
+    controller.stop()
+
+
+def get_messages(count):
+    return [
+        EmailMessage(
+            'Hallo', 'Text', 'info@example.org',
+            ['user{}@example.org'.format(i)]
+        ) for i in range(count)
+    ]
+
+
+def get_recipients(handler):
+    return sorted(e.rcpt_tos[0] for e in handler.envelopes)
+
+
+def test_async_backend_sends_all(smtp_handler):
+    backend = AsyncSMTPEmailBackend()
+    assert backend.send_messages(get_messages(10)) == 10
+    assert get_recipients(smtp_handler) == sorted(
+        'user{}@example.org'.format(i) for i in range(10)
+    )
+    assert len(smtp_handler.peers) <= 3
+    assert backend.send_messages([]) == 0
+
+
+def test_async_backend_keeps_connection_open(smtp_handler):
+    with AsyncSMTPEmailBackend() as backend:
+        for message in get_messages(5):
+            assert backend.send_messages([message]) == 1
+    assert len(smtp_handler.envelopes) == 5
+    assert len(smtp_handler.peers) == 1
+
+
+def test_async_backend_retries_transient(smtp_handler):
+    smtp_handler.failures = 2
+    assert AsyncSMTPEmailBackend().send_messages(get_messages(3)) == 3
+    assert len(smtp_handler.envelopes) == 3
+
+
+def test_async_backend_permanent_error(smtp_handler):
+    smtp_handler.failures = 1
+    smtp_handler.reply = '550 No such user'
+    with pytest.raises(aiosmtplib.SMTPResponseException):
+        AsyncSMTPEmailBackend().send_messages(get_messages(1))
+
+    smtp_handler.failures = 1
+    backend = AsyncSMTPEmailBackend(fail_silently=True)
+    assert backend.send_messages(get_messages(2)) == 1
+
+
+def test_async_backend_behind_celery_email(smtp_handler, settings):
+    # what the celery email task does with one chunk
+    settings.CELERY_EMAIL_BACKEND = ASYNC_BACKEND
+    sent = send_emails([email_to_dict(m) for m in get_messages(5)])
+    assert sent == 5
+    assert len(smtp_handler.envelopes) == 5
+    assert len(smtp_handler.peers) == 1
+
+
+def test_send_mail_messages_async(smtp_handler, settings):
+    settings.BULK_EMAIL_BACKEND = ASYNC_BACKEND
+    send_mail_messages(get_messages(7))
+    assert len(smtp_handler.envelopes) == 7
@@ -1,8 +1,22 @@
 import pytest
 from django.conf import settings
+from django.contrib.gis.geos import Point
+
+from signmob.users.models import User
+from signmob.users.tests.factories import UserFactory
 
 pytestmark = pytest.mark.django_db
 
 
 def test_user_get_absolute_url(user: settings.AUTH_USER_MODEL):
     assert user.get_absolute_url() == f"/users/{user.username}/"
+
+
+def test_user_get_nearby():
+    near = UserFactory(geo=Point(13.41, 52.52))
+    UserFactory(geo=Point(13.06, 52.4))
+    UserFactory(geo=Point(13.41, 52.52), is_active=False)
+    UserFactory()
+
+    nearby = User.objects.get_nearby(Point(13.4, 52.5), 3000)
+    assert list(nearby) == [near]
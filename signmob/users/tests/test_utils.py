@@ -0,0 +1,82 @@
+import pytest
+from django.core import mail
+from django.template.loader import get_template
+
+from signmob.users.models import User
+from signmob.users.tests.factories import UserFactory
+from signmob.users.utils import (
+    PlaceholderUser, prints_user_fields_only, render_template_email,
+    render_template_emails, send_template_emails
+)
+
+pytestmark = pytest.mark.django_db
+
+
+def test_send_template_emails():
+    users = UserFactory.create_batch(3)
+    UserFactory(is_active=False)
+    UserFactory(email='')
+
+    sent = send_template_emails({
+        'user': user,
+        'subject': 'Hallo',
+        'template': 'emails/base.txt',
+        'context': {'user': user},
+    } for user in User.objects.all())
+
+    assert sent == 3
+    assert len(mail.outbox) == 3
+    assert {m.to[0] for m in mail.outbox} == {u.email for u in users}
+    assert all(m.subject == 'Hallo' for m in mail.outbox)
+
+
+def test_send_template_emails_empty():
+    assert send_template_emails([]) == 0
+    assert len(mail.outbox) == 0
+
+
+@pytest.fixture
+def mail_templates(settings):
+    settings.TEMPLATES = [{
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'OPTIONS': {'loaders': [('django.template.loaders.locmem.Loader', {
+            'print.txt': 'Hallo {{ user.name }}, {{ user.get_autologin_prefix }}/',
+            'mobile.txt': 'Hallo {{ user.name }}{% if user.mobile %}, {{ user.mobile }}{% endif %}',
+            'staff.txt': 'Hallo {{ user.name }}{% if user.is_staff %}, Admin{% endif %}',
+            'lower.txt': 'Hallo {{ user.name|lower }}',
+            'capfirst.txt': '{{ user.get_autologin_prefix|capfirst }}',
+            'filter.txt': '{% filter upper %}{{ user.name }}{% endfilter %}',
+        })]},
+    }]
+
+
+@pytest.mark.parametrize('template', [
+    'print.txt', 'mobile.txt', 'staff.txt', 'lower.txt', 'capfirst.txt',
+    'filter.txt'
+])
+def test_render_template_emails(mail_templates, template):
+    users = [
+        UserFactory(mobile='0170 1234', is_staff=True),
+        UserFactory(mobile='', is_staff=False),
+        UserFactory(name='Tom & Jerry'),
+        UserFactory(name='Anna Müller'),
+    ]
+
+    emails = render_template_emails(users, subject='Hallo', template=template)
+
+    assert [m.body for m in emails] == [
+        render_template_email(
+            user=user, subject='Hallo', template=template,
+            context={'user': user}
+        ).body for user in users
+    ]
+
+
+@pytest.mark.parametrize('template,fast', [
+    ('print.txt', True), ('mobile.txt', False), ('staff.txt', False),
+    ('lower.txt', False), ('capfirst.txt', False), ('filter.txt', False),
+])
+def test_prints_user_fields_only(mail_templates, template, fast):
+    assert prints_user_fields_only(
+        get_template(template).template, PlaceholderUser.fields
+    ) is fast
@@ -1,8 +1,15 @@
+import re
+import uuid
+
 from django.core.mail import (
     EmailMessage, EmailMultiAlternatives, get_connection
 )
-from django.template.loader import render_to_string
+from django.template.base import Node, TextNode, Variable, VariableNode
+from django.template.defaulttags import FilterNode
+from django.template.loader import get_template, render_to_string
+from django.template.loader_tags import ExtendsNode, IncludeNode
 from django.conf import settings
+from django.utils.html import escape
 
 
 def send_mail_user(subject, body, user,
@@ -22,13 +29,26 @@ def get_mail_connection(**kwargs):
     )
 
 
-def send_simple_template_mail(user, subject, body, **kwargs):
+def get_bulk_mail_connection(**kwargs):
+    """
+    Connection for batches sent from celery tasks
+    """
+    return get_connection(
+        backend=settings.BULK_EMAIL_BACKEND,
+        **kwargs
+    )
+
+
+def format_simple_template(user, subject, body):
     mail_context = {
         'name': user.name,
         'url': user.get_autologin_url('/')[:-1],
     }
-    user_subject = subject.format(**mail_context)
-    user_body = body.format(**mail_context)
+    return subject.format(**mail_context), body.format(**mail_context)
+
+
+def send_simple_template_mail(user, subject, body, **kwargs):
+    user_subject, user_body = format_simple_template(user, subject, body)
     return user.send_mail(
         user_subject,
         user_body,
@@ -36,11 +56,31 @@ def send_simple_template_mail(user, subject, body, **kwargs):
     )
 
 
-def send_template_email(
+def render_simple_template_mail(user, subject, body, ignore_active=False):
+    if not ignore_active and not user.is_active:
+        return None
+    if not user.email:
+        return None
+    user_subject, user_body = format_simple_template(user, subject, body)
+    return build_mail(user_subject, user_body, user.email)
+
+
+def render_template_email(
         email=None, user=None,
         subject=None, subject_template=None,
         template=None, html_template=None,
-        context=None, **kwargs):
+        context=None, ignore_active=False, **kwargs):
+    """
+    Returns the email message for send_template_email arguments
+    or None if there is no recipient
+    """
+    if user is not None:
+        if not ignore_active and not user.is_active:
+            return None
+        email = user.email
+    if not email:
+        return None
+
     if subject_template is not None:
         subject = render_to_string(subject_template, context)
     body = render_to_string(template, context)
@@ -48,30 +88,256 @@ def send_template_email(
     if html_template is not None:
         kwargs['html'] = render_to_string(html_template, context)
 
-    if user is not None:
-        return user.send_mail(subject, body, **kwargs)
-    elif email is not None:
-        return send_mail(subject, body, email, **kwargs)
+    return build_mail(subject, body, email, **kwargs)
+
+
+def send_template_email(
+        email=None, user=None,
+        subject=None, subject_template=None,
+        template=None, html_template=None,
+        context=None, **kwargs):
+    if user is None and email is None:
+        return True
+    message = render_template_email(
+        email=email, user=user,
+        subject=subject, subject_template=subject_template,
+        template=template, html_template=html_template,
+        context=context, **kwargs
+    )
+    if message is None:
+        return None
+    return message.send(fail_silently=kwargs.get('fail_silently', False))
+
+
+class PlaceholderToken(str):
+    """
+    Prints as the token, but tells the placeholder user when the
+    template tests or compares it
+    """
+    def __new__(cls, token, placeholder):
+        obj = super().__new__(cls, token)
+        obj.placeholder = placeholder
+        return obj
+
+    def tested(self):
+        self.placeholder.tested = True
+
+    def __bool__(self):
+        self.tested()
+        return True
+
+    def __len__(self):
+        self.tested()
+        return super().__len__()
+
+    def __contains__(self, other):
+        self.tested()
+        return super().__contains__(other)
+
+    def __eq__(self, other):
+        self.tested()
+        return super().__eq__(other)
+
+    def __ne__(self, other):
+        self.tested()
+        return super().__ne__(other)
+
+    def __lt__(self, other):
+        self.tested()
+        return super().__lt__(other)
+
+    def __le__(self, other):
+        self.tested()
+        return super().__le__(other)
+
+    def __gt__(self, other):
+        self.tested()
+        return super().__gt__(other)
+
+    def __ge__(self, other):
+        self.tested()
+        return super().__ge__(other)
+
+    __hash__ = str.__hash__
+
+
+class PlaceholderUser:
+    """
+    Stands in for the user when rendering a template once for many
+    users, the fields render as tokens that are replaced per user.
+    Only safe if the template does nothing but print these fields.
+    """
+    fields = ('name', 'email', 'mobile', 'get_autologin_prefix')
+
+    def __init__(self):
+        self.tokens = {field: uuid.uuid4().hex for field in self.fields}
+        for field, token in self.tokens.items():
+            setattr(self, field, PlaceholderToken(token, self))
+        self.pattern = re.compile('|'.join(self.tokens.values()))
+        self.used = {}
+        self.accessed = set()
+        self.tested = False
+
+    def __getattr__(self, name):
+        # only called for attributes other than the token fields
+        if name.startswith('_'):
+            raise AttributeError(name)
+        self.accessed.add(name)
+        return ''
+
+    @property
+    def safe(self):
+        """
+        The template only printed token fields, it did not read other
+        user attributes or branch on the token fields
+        """
+        return not self.accessed and not self.tested
+
+    def render(self, template, context):
+        self.accessed = set()
+        self.tested = False
+        rendered = render_to_string(template, dict(context, user=self))
+        self.used = {
+            field: token for field, token in self.tokens.items()
+            if token in rendered
+        }
+        return rendered
+
+    def get_values(self, user):
+        """
+        Values of the fields in the rendered template, None if one of
+        them would not render as is (empty or changed by autoescaping)
+        """
+        values = {}
+        for field, token in self.used.items():
+            value = getattr(user, field)
+            if callable(value):
+                value = value()
+            value = str(value)
+            if not value or str(escape(value)) != value:
+                return None
+            values[token] = value
+        return values
+
+    def substitute(self, text, values):
+        return self.pattern.sub(lambda match: values[match.group()], text)
+
+
+USER_VARIABLE = re.compile(r'\buser\b')
+
+
+def prints_user_fields_only(template, fields):
+    """
+    The template (a compiled django template) and the templates it
+    extends or includes use the user only as {{ user.<field> }}
+    without filters, no tag refers to the user
+    """
+    for node in template.nodelist.get_nodes_by_type(Node):
+        if isinstance(node, TextNode):
+            continue
+        if isinstance(node, VariableNode):
+            expression = node.filter_expression
+            var = expression.var
+            if not isinstance(var, Variable) or var.lookups[0] != 'user':
+                continue
+            if (expression.filters or len(var.lookups) != 2 or
+                    var.lookups[1] not in fields):
+                return False
+            continue
+        if isinstance(node, FilterNode):
+            # {% filter %} changes the output of the block
+            return False
+        if USER_VARIABLE.search(node.token.contents):
+            return False
+        if isinstance(node, (ExtendsNode, IncludeNode)):
+            name = (
+                node.parent_name if isinstance(node, ExtendsNode)
+                else node.template
+            )
+            if not isinstance(name.var, str) or name.filters:
+                return False
+            if not prints_user_fields_only(
+                    get_template(name.var).template, fields):
+                return False
     return True
 
 
-def send_mail(subject, body, user_email,
-              from_email=None,
-              html=None,
-              attachments=None, fail_silently=False,
-              bounce_check=True, headers=None,
-              priority=True,
-              queue=None, auto_bounce=True,
-              **kwargs):
-    if not user_email:
-        return
+def render_template_emails(users, subject=None, template=None,
+                           context=None, ignore_active=False, **kwargs):
+    """
+    Email messages for users that share the context apart from 'user'.
+    The template is rendered once and the user fields are filled in
+    per user. Only templates that print user fields without filters or
+    tags take this path. Templates that read other user attributes or
+    test the fields, users whose fields could render differently and any
+    mismatch for the first user fall back to rendering each mail in full.
+    """
+    users = [
+        user for user in users
+        if (ignore_active or user.is_active) and user.email
+    ]
+    if not users:
+        return []
+    if context is None:
+        context = {}
+    placeholder = PlaceholderUser()
+    rendered = None
+    if prints_user_fields_only(
+            get_template(template).template, placeholder.fields):
+        rendered = placeholder.render(template, context)
+        if not placeholder.safe:
+            rendered = None
+    checked = False
+
+    emails = []
+    for user in users:
+        body = None
+        values = placeholder.get_values(user) if rendered else None
+        if values is not None:
+            body = placeholder.substitute(rendered, values)
+            if not checked:
+                checked = True
+                if body != render_to_string(template, dict(context, user=user)):
+                    rendered = None
+                    body = None
+        if body is None:
+            body = render_to_string(template, dict(context, user=user))
+        emails.append(build_mail(subject, body, user.email, **kwargs))
+    return emails
+
+
+def send_template_emails(messages, fail_silently=False):
+    """
+    Render messages (dicts of send_template_email arguments) and send
+    them over one connection. The celery email backend queues one task
+    per CELERY_EMAIL_CHUNK_SIZE messages.
+    """
+    emails = [
+        email for email in (
+            render_template_email(**message) for message in messages
+        ) if email is not None
+    ]
+    return send_mail_messages(emails, fail_silently=fail_silently)
+
 
+def send_mail_messages(emails, fail_silently=False, connection=None):
+    if not emails:
+        return 0
+    if connection is None:
+        connection = get_bulk_mail_connection(fail_silently=fail_silently)
+    return connection.send_messages(emails)
+
+
+def build_mail(subject, body, user_email,
+               from_email=None,
+               html=None,
+               attachments=None,
+               headers=None,
+               connection=None,
+               **kwargs):
     if from_email is None:
         from_email = settings.DEFAULT_FROM_EMAIL
 
-    backend_kwargs = {}
-    connection = get_mail_connection(**backend_kwargs)
-
     if headers is None:
         headers = {}
     headers.update({
@@ -97,4 +363,25 @@ def send_mail(subject, body, user_email,
         for name, data, mime_type in attachments:
             email.attach(name, data, mime_type)
 
+    return email
+
+
+def send_mail(subject, body, user_email,
+              from_email=None,
+              html=None,
+              attachments=None, fail_silently=False,
+              bounce_check=True, headers=None,
+              priority=True,
+              queue=None, auto_bounce=True,
+              **kwargs):
+    if not user_email:
+        return
+
+    backend_kwargs = {}
+    connection = get_mail_connection(**backend_kwargs)
+
+    email = build_mail(
+        subject, body, user_email, from_email=from_email, html=html,
+        attachments=attachments, headers=headers, connection=connection
+    )
     return email.send(fail_silently=fail_silently)